@@ -1,178 +1,847 @@
 import os
-import yaml
-import re
-from dotenv import load_dotenv
-from openai import OpenAI
-
-# 加载环境变量
-load_dotenv()
-
-# 从环境变量获取API密钥
-api_key = os.getenv('OPENAI_API_KEY')
-if not api_key:
-    raise ValueError("未找到OPENAI_API_KEY环境变量，请确保.env文件中包含该变量")
-
-client = OpenAI(api_key=api_key, base_url="https://api.deepseek.com")
-
-# 加载gsm8k_cod.yaml配置文件
-try:
-    with open('gsm8k_cod.yaml', 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
-    system_prompt = config.get('system_prompt', '')
-except Exception as e:
-    print(f"加载配置文件失败: {e}")
-    system_prompt = "Think step by step, but only keep minimum draft for each thinking step, with 5 words at most.\nReturn the answer at the end of the response after a separator ####."
-
-def convert_latex_to_readable(text):
-    """将LaTeX数学公式转换为更易读的格式，递归处理$...$、\(...\)、\begin{...}...\end{...}等结构
-    Args:
-        text (str): 包含LaTeX代码的文本
+import asyncio
+import functools
+import queue
+import threading
+import time
+import weakref
+from collections import deque, namedtuple
+from latex_readable import convert_latex_to_readable
+
+# openai/httpx/yaml/dotenv 等较重的依赖都在首次调用AI时才导入，导入本模块本身很轻
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gsm8k_cod.yaml')
+DEFAULT_SYSTEM_PROMPT = "Think step by step, but only keep minimum draft for each thinking step, with 5 words at most.\nReturn the answer at the end of the response after a separator ####."
+# 对话回复的总时长上限（秒）；timeout 参数只限制两次读取之间的等待，推理模型的长回复只要持续输出就不会超时
+MAX_CHAT_DURATION = 600
+
+AIConfig = namedtuple('AIConfig', ['api_key', 'base_url', 'model', 'max_concurrency',
+                                   'timeout', 'system_prompt', 'prompt_config',
+                                   'fewshot', 'stream_usage'])
+
+
+class AIConfigError(Exception):
+    """AI功能配置错误，code 为错误类型（如 'missing_api_key'），message 为提示信息"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+@functools.lru_cache(maxsize=None)
+def get_config():
+    """读取AI配置，首次成功后缓存（配置错误不会被缓存，修正后可重试）
+
+    接口地址、模型名称、并发上限和超时均可通过环境变量覆盖（例如指向本地模拟服务器）；
+    AI_FEWSHOT=0 不发送少样本示例，AI_STREAM_USAGE=0 流式请求不索取用量统计（供不支持stream_options的服务使用）。
+
     Returns:
-        str: 转换后的易读文本
+        AIConfig: AI配置
+    Raises:
+        AIConfigError: 未配置OPENAI_API_KEY时抛出
+    """
+    try:
+        from dotenv import load_dotenv
+        # 加载环境变量
+        load_dotenv()
+    except ImportError:
+        pass
+
+    # 从环境变量获取API密钥
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        raise AIConfigError('missing_api_key', "未找到OPENAI_API_KEY环境变量，请确保.env文件中包含该变量")
+
+    # 加载gsm8k_cod.yaml配置文件
+    try:
+        import yaml
+        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+            prompt_config = yaml.safe_load(f) or {}
+        system_prompt = prompt_config.get('system_prompt', '')
+    except Exception as e:
+        print(f"加载配置文件失败: {e}")
+        prompt_config = {}
+        system_prompt = DEFAULT_SYSTEM_PROMPT
+
+    return AIConfig(
+        api_key=api_key,
+        base_url=os.getenv('OPENAI_BASE_URL', "https://api.deepseek.com"),
+        model=os.getenv('AI_MODEL', "deepseek-reasoner"),
+        max_concurrency=int(os.getenv('AI_MAX_CONCURRENCY', '8')),
+        timeout=float(os.getenv('AI_TIMEOUT', '120')),
+        system_prompt=system_prompt,
+        prompt_config=prompt_config,
+        fewshot=os.getenv('AI_FEWSHOT', '1') != '0',
+        stream_usage=os.getenv('AI_STREAM_USAGE', '1') != '0',
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_prompt_prefix():
+    """渲染一次系统提示和少样本示例，作为所有请求共享的固定前缀
+
+    前缀在进程内只生成一次且逐字节不变，服务端的提示缓存（prompt caching）才能命中；
+    少样本示例按配置文件中的format渲染进系统消息。
+
+    Returns:
+        tuple: 前缀消息，目前只有一条系统消息
+    """
+    config = get_config()
+    parts = [config.system_prompt.strip()]
+    template = config.prompt_config.get('format')
+    fewshot = config.prompt_config.get('fewshot') or []
+    if config.fewshot and template and fewshot:
+        try:
+            parts.extend(template.strip().format(question=str(example['question']).strip(),
+                                                 answer=str(example['answer']).strip())
+                         for example in fewshot)
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            print(f"少样本示例格式错误，已忽略: {e}")
+            del parts[1:]
+    return ({"role": "system", "content": "\n\n".join(parts)},)
+
+
+def get_config_error():
+    """检查AI功能是否可用，可用时返回None，否则返回AIConfigError"""
+    try:
+        get_config()
+        return None
+    except AIConfigError as e:
+        return e
+
+
+def __getattr__(name):
+    # 兼容旧代码中直接读取 API.system_prompt 的用法
+    if name == 'system_prompt':
+        return get_config().system_prompt
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@functools.lru_cache(maxsize=None)
+def get_response_cache():
+    """回复缓存：AI_CACHE=0 可关闭，AI_CACHE_TTL/AI_CACHE_MAX_ENTRIES 控制过期时间和容量"""
+    if os.getenv('AI_CACHE', '1') == '0':
+        return None
+    from ai_cache import ResponseCache, default_cache_path
+    return ResponseCache(
+        default_cache_path(),
+        ttl=float(os.getenv('AI_CACHE_TTL', str(7 * 24 * 3600))),
+        max_entries=int(os.getenv('AI_CACHE_MAX_ENTRIES', '2000'))
+    )
+
+
+def cache_stats():
+    """返回回复缓存的命中/未命中统计"""
+    cache = get_response_cache()
+    return cache.stats() if cache else {}
+
+
+def _cache_get(messages):
+    cache = get_response_cache()
+    if cache is None:
+        return None, None
+    config = get_config()
+    key = cache.make_key(config.model, config.system_prompt, messages)
+    try:
+        return key, cache.get(key)
+    except Exception as e:
+        print(f"读取回复缓存失败: {e}")
+        return key, None
+
+
+def _cache_set(key, value):
+    cache = get_response_cache()
+    if cache is None or key is None:
+        return
+    try:
+        cache.set(key, value)
+    except Exception as e:
+        print(f"写入回复缓存失败: {e}")
+
+
+async def _acache_get(messages):
+    # SQLite读取也会更新访问时间，其他进程持有写锁时最多等待10秒，放到线程池中执行，不阻塞事件循环
+    return await asyncio.to_thread(_cache_get, messages)
+
+
+async def _acache_set(key, value):
+    if key is not None:
+        await asyncio.to_thread(_cache_set, key, value)
+
+# 每个事件循环一个共享的异步客户端（httpx连接池 + 并发信号量）
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """获取当前事件循环对应的异步客户端和并发信号量
+
+    同一事件循环内的所有请求共享一个带连接池的httpx会话，
+    并由信号量限制同时进行的请求数量。
+
+    Returns:
+        tuple: (AsyncOpenAI, asyncio.Semaphore)
+    Raises:
+        AIConfigError: 未配置OPENAI_API_KEY时抛出
+    """
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(loop)
+    if entry is None:
+        config = get_config()
+        import httpx
+        from openai import AsyncOpenAI
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=config.max_concurrency,
+                                max_keepalive_connections=config.max_concurrency),
+            timeout=httpx.Timeout(config.timeout, connect=10.0),
+        )
+        client = AsyncOpenAI(api_key=config.api_key, base_url=config.base_url, http_client=http_client)
+        entry = (client, asyncio.Semaphore(config.max_concurrency))
+        _async_clients[loop] = entry
+    return entry
+
+
+class _LoopThread:
+    """后台事件循环线程，供同步包装函数提交协程，使多个线程的请求可以并发"""
+
+    def __init__(self):
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=self._loop.run_forever,
+                                          name="ai-event-loop", daemon=True)
+                thread.start()
+            return self._loop
+
+    def submit(self, coro):
+        """提交协程到后台事件循环，返回concurrent.futures.Future（可调用cancel取消）"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def run(self, coro, timeout=None):
+        """阻塞等待协程结果，超时则取消后台任务并抛出TimeoutError"""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+
+_runner = _LoopThread()
+
+
+def submit_async(coro):
+    """在共享后台事件循环中运行协程，返回可取消的Future"""
+    return _runner.submit(coro)
+
+class LatencyTracker:
+    """记录最近的请求延迟，提供分位数用于决定对冲请求的发起时机"""
+
+    def __init__(self, window=200, min_samples=5):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.min_samples = min_samples
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.deadline_misses = 0
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q):
+        """返回q分位（0-100）的延迟，没有样本时返回None"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+    def hedge_delay(self, default):
+        """对冲延迟取p90，样本不足时使用default"""
+        with self._lock:
+            enough = len(self._samples) >= self.min_samples
+        return self.percentile(90) if enough else default
+
+    def stats(self):
+        with self._lock:
+            count = len(self._samples)
+        return {
+            'count': count,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'deadline_misses': self.deadline_misses,
+        }
+
+
+latency_tracker = LatencyTracker()
+
+
+def latency_stats():
+    """返回非流式请求的延迟分布和对冲统计"""
+    return latency_tracker.stats()
+
+
+class PromptUsageTracker:
+    """统计每次请求的提示token数和服务端提示缓存命中的token数（来自响应的usage）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        self.last = None
+
+    @staticmethod
+    def _cached_tokens(usage):
+        # OpenAI: usage.prompt_tokens_details.cached_tokens；DeepSeek: usage.prompt_cache_hit_tokens
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached = getattr(details, 'cached_tokens', None) if details is not None else None
+        if cached is None:
+            cached = getattr(usage, 'prompt_cache_hit_tokens', None)
+        return cached or 0
+
+    def record(self, usage):
+        if usage is None:
+            return
+        prompt = getattr(usage, 'prompt_tokens', None) or 0
+        cached = self._cached_tokens(usage)
+        completion = getattr(usage, 'completion_tokens', None) or 0
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt
+            self.cached_tokens += cached
+            self.completion_tokens += completion
+            self.last = {'prompt_tokens': prompt, 'cached_tokens': cached, 'completion_tokens': completion}
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'prompt_tokens': self.prompt_tokens,
+                'prompt_tokens_per_call': self.prompt_tokens / self.calls if self.calls else 0.0,
+                'cached_tokens': self.cached_tokens,
+                'cached_fraction': self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+                'completion_tokens': self.completion_tokens,
+                'last': self.last,
+            }
+
+
+prompt_usage = PromptUsageTracker()
+
+
+def prompt_usage_stats():
+    """返回提示token数和服务端缓存命中比例的统计"""
+    return prompt_usage.stats()
+
+
+class _Flight:
+    """一个在途的上游请求：task为实际请求，waiters为等待结果的调用方数量"""
+
+    def __init__(self, table, key, coro_factory):
+        self.table = table
+        self.key = key
+        self.waiters = 0
+        self.chunks = []  # 流式请求已收到的片段
+        self.changed = asyncio.Event()
+        self.task = asyncio.ensure_future(coro_factory(self))
+        self.task.add_done_callback(self._done)
+
+    def notify(self):
+        # 唤醒所有等待新片段的调用方，之后的等待使用新的事件
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def _done(self, _):
+        if self.table.get(self.key) is self:
+            del self.table[self.key]
+        self.notify()
+
+
+class SingleFlight:
+    """合并请求键相同的并发调用：同一时刻只向上游发送一次请求，所有调用方共享结果
+
+    asyncio的Future不能跨事件循环共享，因此每个事件循环一张在途请求表；
+    同步包装函数都在共享的后台事件循环中执行，同步和异步调用方会被一起合并。
+    所有调用方都取消后才取消上游请求。
     """
-    import re as _re
-    if not isinstance(text, str):
-        return text
-    # 1. 递归处理$...$结构
-    def remove_dollar(match):
-        inner = match.group(1)
-        return convert_latex_to_readable(inner)
-    text = _re.sub(r'\${1,2}([^$]+)\${1,2}', remove_dollar, text)
-    # 2. 递归处理\(...\)结构
-    text = _re.sub(r'\\\((.*?)\\\)', lambda m: convert_latex_to_readable(m.group(1)), text)
-    # 3. 递归处理\begin{...}...\end{...}结构
-    def begin_end_repl(match):
-        inner = match.group(2)
-        return convert_latex_to_readable(inner)
-    text = _re.sub(r'\\begin\{[^}]+\}(.*?)\\end\{[^}]+\}', begin_end_repl, text, flags=_re.DOTALL)
-    # 4. 定义LaTeX符号到易读格式的映射
-    replacements = {
-        r'\\frac\{([^{}]+)\}\{([^{}]+)\}': r'(\1)/(\2)',
-        r'\\sqrt\{([^{}]+)\}': r'√(\1)',
-        r'\\sum_': '∑',
-        r'\\prod_': '∏',
-        r'\\int_': '∫',
-        r'\\infty': '∞',
-        r'\\pi': 'π',
-        r'\\alpha': 'α',
-        r'\\beta': 'β',
-        r'\\gamma': 'γ',
-        r'\\delta': 'δ',
-        r'\\theta': 'θ',
-        r'\\lambda': 'λ',
-        r'\\mu': 'μ',
-        r'\\sigma': 'σ',
-        r'\\omega': 'ω',
-        r'\\leq': '≤',
-        r'\\geq': '≥',
-        r'\\neq': '≠',
-        r'\\approx': '≈',
-        r'\\times': '×',
-        r'\\div': '÷',
-        r'\\pm': '±',
-        r'\\cdot': '·',
-        r'(?<![\\^])\^\{([^{}]+)\}': r'^(\1)',
-        r'(?<![\\_])_\{([^{}]+)\}': r'_(\1)',
-        r'\\left': '',
-        r'\\right': '',
-        r'\\\\': '\n'
-    }
-    for pattern, replacement in replacements.items():
-        text = _re.sub(pattern, replacement, text)
-    # 移除残留的$和\(\)
-    text = _re.sub(r'\$', '', text)
-    text = _re.sub(r'\\\(|\\\)', '', text)
-    # 清理多余空白
-    text = _re.sub(r'\s+', ' ', text).strip()
-    return text
-
-def get_ai_response(prompt):
-    """获取AI对提示的回复
-    
+
+    def __init__(self):
+        self._tables = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.upstream = 0
+        self.coalesced = 0
+
+    def _join(self, key, coro_factory):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            table = self._tables.get(loop)
+            if table is None:
+                table = self._tables[loop] = {}
+            flight = table.get(key)
+            self.calls += 1
+            if flight is None:
+                self.upstream += 1
+            else:
+                self.coalesced += 1
+        if flight is None:
+            flight = table[key] = _Flight(table, key, coro_factory)
+        flight.waiters += 1
+        return flight
+
+    def _leave(self, flight):
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            # 立即移出在途表，之后的相同请求会重新发起
+            if flight.table.get(flight.key) is flight:
+                del flight.table[flight.key]
+            flight.task.cancel()
+
+    async def call(self, key, coro_factory):
+        """执行或加入一个非流式请求，coro_factory() 返回实际请求的协程"""
+        flight = self._join(key, lambda _: coro_factory())
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            self._leave(flight)
+
+    async def stream(self, key, agen_factory):
+        """执行或加入一个流式请求，后加入的调用方先补发已收到的片段，再跟随后续片段"""
+        flight = self._join(key, lambda f: self._pump(f, agen_factory()))
+        try:
+            i = 0
+            while True:
+                changed = flight.changed
+                while i < len(flight.chunks):
+                    yield flight.chunks[i]
+                    i += 1
+                if flight.task.done():
+                    flight.task.result()  # 上游出错时向每个调用方抛出同一异常
+                    return
+                await changed.wait()
+        finally:
+            self._leave(flight)
+
+    @staticmethod
+    async def _pump(flight, agen):
+        try:
+            async for item in agen:
+                flight.chunks.append(item)
+                flight.notify()
+        finally:
+            await agen.aclose()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'upstream': self.upstream,
+                'coalesced': self.coalesced,
+            }
+
+
+single_flight = SingleFlight()
+
+
+def coalesce_stats():
+    """返回请求合并统计：calls为总调用数，upstream为实际发出的请求数，coalesced为被合并的调用数"""
+    return single_flight.stats()
+
+
+def _flight_key(kind, messages):
+    from ai_cache import ResponseCache
+    config = get_config()
+    return ResponseCache.make_key(config.model, config.system_prompt, [kind] + messages)
+
+
+def _assemble_messages(user_message, history=None):
+    """组装请求消息：固定前缀 + 历史对话 + 本次用户消息
+
+    历史记录自带系统消息时沿用其自身的系统消息，不再添加前缀。
+    """
+    if history and history[0]["role"] == "system":
+        messages = list(history)
+    else:
+        messages = list(get_prompt_prefix())
+        if history:
+            messages.extend(history)
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+
+async def _complete(messages, timeout=None):
+    """发起一次非流式请求，返回转换后的回复内容，失败时抛出异常"""
+    config = get_config()
+    client, semaphore = get_async_client()
+    async with semaphore:
+        start = time.monotonic()
+        # 创建聊天完成请求
+        response = await asyncio.wait_for(
+            client.chat.completions.create(model=config.model, messages=messages),
+            timeout or config.timeout
+        )
+        latency_tracker.record(time.monotonic() - start)
+    prompt_usage.record(getattr(response, 'usage', None))
+    # 获取回复内容并转换LaTeX公式
+    return convert_latex_to_readable(response.choices[0].message.content)
+
+
+async def aget_ai_response(prompt, timeout=None, use_cache=True):
+    """异步获取AI对提示的回复
+
     Args:
         prompt (str): 提示词
-        
+        timeout (float, optional): 单次请求超时时间（秒），默认取配置中的timeout
+        use_cache (bool, optional): 为False时跳过缓存，也不与相同的并发调用合并，总是请求新的回复
+
     Returns:
         str: AI的回复内容
     """
     try:
-        # 创建消息列表，包含系统提示和用户提示
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": prompt}
-        ]
-        
-        # 创建聊天完成请求
-        response = client.chat.completions.create(
-            model="deepseek-reasoner",
-            messages=messages
-        )
-        
-        # 获取回复内容并转换LaTeX公式
-        content = response.choices[0].message.content
-        return convert_latex_to_readable(content)
+        messages = _assemble_messages(prompt)
+
+        key = None
+        if use_cache:
+            key, cached = await _acache_get(messages)
+            if cached is not None:
+                return cached
+
+        # 相同提示的并发调用共享同一个上游请求；跳过缓存的调用要的是新回复，不合并
+        if use_cache:
+            content = await single_flight.call(_flight_key('response', messages),
+                                               lambda: _complete(messages, timeout))
+        else:
+            content = await _complete(messages, timeout)
+        await _acache_set(key, content)
+        return content
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
         return f"API调用错误: {str(e)}"
 
-def chat_with_ai(user_message, history=None, timeout=30):
-    """与AI进行对话，并获取回复内容和推理过程
-    
+
+async def aget_ai_response_hedged(prompt, deadline, hedge=True, use_cache=True):
+    """带硬性截止时间和对冲请求的异步获取回复
+
+    第一个请求超过观测到的p90延迟仍未返回时，再发起一个相同的对冲请求，
+    取先成功的结果并取消另一个；请求失败时若还未对冲则立即补发一次。
+    相同提示的并发调用共享同一组请求（use_cache为False时除外）。
+
+    Args:
+        prompt (str): 提示词
+        deadline (float): 截止时间（秒），超时后取消所有请求
+        hedge (bool, optional): 是否启用对冲请求
+        use_cache (bool, optional): 为False时跳过缓存，也不与相同的并发调用合并
+
+    Returns:
+        str | None: AI的回复内容，截止时间内没有成功结果时返回None
+    """
+    messages = _assemble_messages(prompt)
+    key = None
+    if use_cache:
+        key, cached = await _acache_get(messages)
+        if cached is not None:
+            return cached
+
+    if use_cache:
+        request = single_flight.call(_flight_key('hedged', messages),
+                                     lambda: _hedged_complete(messages, deadline, hedge, key))
+    else:
+        request = _hedged_complete(messages, deadline, hedge, key)
+    try:
+        return await asyncio.wait_for(request, deadline)
+    except asyncio.TimeoutError:
+        # 加入已有请求的调用方按自己的截止时间放弃等待
+        latency_tracker.deadline_misses += 1
+        return None
+
+
+async def _hedged_complete(messages, deadline, hedge, key):
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline
+    hedge_delay = latency_tracker.hedge_delay(default=deadline / 2)
+    primary = asyncio.ensure_future(_complete(messages, deadline))
+    pending = {primary}
+    hedged = not hedge
+    try:
+        while pending:
+            remaining = end - loop.time()
+            if remaining <= 0:
+                break
+            wait = remaining if hedged else min(remaining, max(0.0, hedge_delay - (deadline - remaining)))
+            done, pending = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        latency_tracker.hedge_wins += 1
+                    content = task.result()
+                    await _acache_set(key, content)
+                    return content
+            if not hedged and end - loop.time() > 0:
+                # 超过对冲延迟或首个请求失败，补发一个相同的请求
+                hedged = True
+                latency_tracker.hedges += 1
+                pending.add(asyncio.ensure_future(_complete(messages, end - loop.time())))
+        if pending or end - loop.time() <= 0:
+            latency_tracker.deadline_misses += 1
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _stream_deltas(messages, timeout):
+    """发起流式请求，按到达顺序逐个产出 (kind, text)，kind为'reasoning'或'content'
+
+    timeout 是空闲超时：每收到一个片段重新计时，超过timeout秒没有新片段时抛出TimeoutError，
+    持续输出的长回复不受总时长限制。
+    """
+    config = get_config()
+    client, semaphore = get_async_client()
+    # 请求在流的最后一个片段中附带用量统计
+    extra = {'stream_options': {'include_usage': True}} if config.stream_usage else {}
+    async with semaphore:
+        # 等待响应头（包括客户端自动重试）同样不超过一个空闲超时
+        response = await asyncio.wait_for(client.chat.completions.create(
+            model=config.model,
+            messages=messages,
+            stream=True,
+            timeout=timeout,
+            **extra
+        ), timeout)
+        chunks = response.__aiter__()
+        try:
+            while True:
+                try:
+                    # 每个片段单独计时（包括不含文本的片段），不是整个流共用一个截止时间
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                except StopAsyncIteration:
+                    break
+                if chunk and getattr(chunk, 'usage', None) is not None:
+                    prompt_usage.record(chunk.usage)
+                if not chunk or not hasattr(chunk, 'choices') or not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                # 健壮性增强：类型和内容判断
+                if hasattr(delta, 'reasoning_content') and isinstance(delta.reasoning_content, str) and delta.reasoning_content:
+                    yield 'reasoning', delta.reasoning_content
+                elif hasattr(delta, 'content') and isinstance(delta.content, str) and delta.content:
+                    yield 'content', delta.content
+        finally:
+            await response.close()
+
+
+async def astream_chat_with_ai(user_message, history=None, timeout=30, use_cache=True):
+    """异步流式对话，推理内容和回复内容一到达就产出
+
     Args:
         user_message (str): 用户输入的消息
         history (list, optional): 历史对话记录，格式为[{"role": "...", "content": "..."}]
-        timeout (int, optional): API请求超时时间，默认30秒
-    
+        timeout (int, optional): 空闲超时，超过该秒数没有新片段时抛出TimeoutError，默认30秒（最小30秒）
+        use_cache (bool, optional): 为False时跳过缓存，也不与相同的并发流合并，总是请求新的回复
+
+    Yields:
+        tuple: (kind, text)，kind为'reasoning'或'content'，text为原始文本片段
+    """
+    messages = _assemble_messages(user_message, history)
+
+    key = None
+    if use_cache:
+        key, cached = await _acache_get(messages)
+        if cached is not None:
+            content, reasoning_content = cached
+            if reasoning_content:
+                yield 'reasoning', reasoning_content
+            if content:
+                yield 'content', content
+            return
+
+    # 相同对话的并发流共享同一个上游流，后加入的调用方先收到已到达的片段；跳过缓存的调用不合并
+    if use_cache:
+        stream = single_flight.stream(_flight_key('stream', messages),
+                                      lambda: _upstream_stream(messages, timeout, key))
+    else:
+        stream = _upstream_stream(messages, timeout, key)
+    try:
+        async for item in stream:
+            yield item
+    finally:
+        await stream.aclose()
+
+
+async def _upstream_stream(messages, timeout, key):
+    timeout = max(30, timeout)  # 确保最小超时时间为30秒
+    # 用列表收集片段，结束时一次性拼接，避免长文本反复 += 的二次方开销
+    parts = {'reasoning': [], 'content': []}
+    stream = _stream_deltas(messages, timeout)
+    try:
+        async for kind, text in stream:
+            parts[kind].append(text)
+            yield kind, text
+    finally:
+        await stream.aclose()
+
+    content = ''.join(parts['content'])
+    reasoning_content = ''.join(parts['reasoning'])
+    if content or reasoning_content:
+        await _acache_set(key, [convert_latex_to_readable(content), convert_latex_to_readable(reasoning_content)])
+
+
+async def _collect_chat(user_message, history, timeout, use_cache):
+    parts = {'reasoning': [], 'content': []}
+    async for kind, text in astream_chat_with_ai(user_message, history, timeout, use_cache):
+        parts[kind].append(text)
+    return parts
+
+
+async def achat_with_ai(user_message, history=None, timeout=30, use_cache=True, max_duration=MAX_CHAT_DURATION):
+    """异步与AI进行对话，并获取回复内容和推理过程
+
+    Args:
+        user_message (str): 用户输入的消息
+        history (list, optional): 历史对话记录，格式为[{"role": "...", "content": "..."}]
+        timeout (int, optional): 两次读取之间的最长等待时间，默认30秒（最小30秒）；
+            只要片段持续到达，整个回复的时间可以超过它
+        use_cache (bool, optional): 为False时跳过缓存，总是请求新的回复
+        max_duration (float, optional): 整个回复的最长时间（秒），None表示不限
+
     Returns:
         tuple: (content, reasoning_content) 返回AI的回复内容和推理内容
     """
     try:
-        # 如果没有提供历史记录，则创建一个新的消息列表
-        if history is None:
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ]
-        else:
-            # 使用提供的历史记录，并添加系统提示和新的用户消息
-            messages = history.copy()
-            # 确保第一条消息是系统提示
-            if not messages or messages[0]["role"] != "system":
-                messages.insert(0, {"role": "system", "content": system_prompt})
-            messages.append({"role": "user", "content": user_message})
-        
-        # 创建聊天完成请求，设置超时和重试参数
-        response = client.chat.completions.create(
-            model="deepseek-reasoner",
-            messages=messages,
-            stream=True,
-            timeout=max(30, timeout)  # 确保最小超时时间为30秒
-        )
-        
-        # 处理流式响应
-        reasoning_content = ""
-        content = ""
-        
-        for chunk in response:
-            if not chunk or not hasattr(chunk, 'choices') or not chunk.choices:
-                continue
-            delta = chunk.choices[0].delta
-            # 健壮性增强：类型和内容判断
-            if hasattr(delta, 'reasoning_content') and isinstance(delta.reasoning_content, str) and delta.reasoning_content:
-                reasoning_content += delta.reasoning_content
-            elif hasattr(delta, 'content') and isinstance(delta.content, str) and delta.content:
-                content += delta.content
-        
+        parts = await asyncio.wait_for(_collect_chat(user_message, history, timeout, use_cache), max_duration)
+        content = ''.join(parts['content'])
+        reasoning_content = ''.join(parts['reasoning'])
+
         # 检查是否获取到内容
         if not content and not reasoning_content:
             raise Exception("未能获取到有效的AI回复内容")
-            
+
         # 转换LaTeX公式为易读格式
         content = convert_latex_to_readable(content)
         reasoning_content = convert_latex_to_readable(reasoning_content)
-        
+
         return content, reasoning_content
-        
+
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
         error_msg = f"AI回复出错: {e!r}"
         return error_msg, ""
 
+
+def get_ai_response(prompt, use_cache=True):
+    """获取AI对提示的回复（同步包装，实际请求在共享后台事件循环中执行）
+
+    Args:
+        prompt (str): 提示词
+        use_cache (bool, optional): 为False时跳过缓存，总是请求新的回复
+
+    Returns:
+        str: AI的回复内容
+    """
+    try:
+        timeout = get_config().timeout + 5
+        return _runner.run(aget_ai_response(prompt, use_cache=use_cache), timeout)
+    except Exception as e:
+        return f"API调用错误: {str(e)}"
+
+
+def get_ai_response_hedged(prompt, deadline, hedge=True, use_cache=True):
+    """带截止时间和对冲请求的同步获取回复，截止时间内没有结果时返回None
+
+    Args:
+        prompt (str): 提示词
+        deadline (float): 截止时间（秒）
+        hedge (bool, optional): 是否启用对冲请求
+        use_cache (bool, optional): 为False时跳过缓存
+    """
+    try:
+        get_config()
+        return _runner.run(aget_ai_response_hedged(prompt, deadline, hedge, use_cache), deadline + 1)
+    except Exception as e:
+        print(f"AI请求失败: {e}")
+        return None
+
+
+def chat_with_ai(user_message, history=None, timeout=30, use_cache=True, max_duration=MAX_CHAT_DURATION):
+    """与AI进行对话，并获取回复内容和推理过程（同步包装）
+
+    Args:
+        user_message (str): 用户输入的消息
+        history (list, optional): 历史对话记录，格式为[{"role": "...", "content": "..."}]
+        timeout (int, optional): 两次读取之间的最长等待时间，默认30秒（最小30秒）
+        use_cache (bool, optional): 为False时跳过缓存，总是请求新的回复
+        max_duration (float, optional): 整个回复的最长时间（秒），None表示不限
+
+    Returns:
+        tuple: (content, reasoning_content) 返回AI的回复内容和推理内容
+    """
+    try:
+        wait = max_duration + 5 if max_duration is not None else None
+        return _runner.run(achat_with_ai(user_message, history, timeout, use_cache, max_duration), wait)
+    except Exception as e:
+        return f"AI回复出错: {e!r}", ""
+
+
+def stream_chat_with_ai(user_message, history=None, timeout=30, use_cache=True, cancelled=None):
+    """同步流式对话生成器，在共享后台事件循环中请求，片段到达后立即产出
+
+    提前关闭生成器（break或close）会取消后台请求。
+
+    Args:
+        user_message (str): 用户输入的消息
+        history (list, optional): 历史对话记录
+        timeout (int, optional): 空闲超时，超过该秒数没有新片段时抛出TimeoutError，默认30秒（最小30秒）
+        use_cache (bool, optional): 为False时跳过缓存
+        cancelled (callable, optional): 返回True时结束生成并取消后台请求；
+            每次等待和产出片段前都会检查，等待下一个片段期间也会定期检查（供其他线程取消）
+
+    Yields:
+        tuple: (kind, text)，kind为'reasoning'或'content'
+    """
+    chunks = queue.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for item in astream_chat_with_ai(user_message, history, timeout, use_cache):
+                chunks.put(item)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            chunks.put(e)
+        finally:
+            chunks.put(done)
+
+    future = _runner.submit(pump())
+    try:
+        while True:
+            if cancelled is None:
+                item = chunks.get()
+            else:
+                # 片段连续到达时 get 不会超时，每轮都要检查，否则整个回复结束前都无法取消
+                if cancelled():
+                    break
+                try:
+                    item = chunks.get(timeout=0.05)
+                except queue.Empty:
+                    continue
+                if cancelled():
+                    break
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        future.cancel()
@@ -3,45 +3,293 @@
 ai_application_question.py
 AI自动生成应用题及答案逻辑模块
 """
-import random
-import math
-from API import get_ai_response
+import queue
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+from functools import lru_cache
+
+import Un
+from question_templates import default_engine
+
+# 题目答案中的第一个数（整数、小数或分数）
+_NUMBER_RE = re.compile(r'[-+]?\d+(?:\.\d+)?(?:/\d+)?')
+# Un.cal 只支持整数和 + - * / ( )
+_EXPRESSION_RE = re.compile(r'^[\d+\-*/()]+$')
+_EXPRESSION_TABLE = str.maketrans({'×': '*', '÷': '/', '（': '(', '）': ')', '＋': '+', '－': '-', '＝': '='})
+# 校验单个算式的最长时间（秒）和最大长度，避免异常输出拖住生成线程
+VERIFY_TIMEOUT = 2.0
+MAX_EXPRESSION_LENGTH = 200
+
+
+def parse_number(text):
+    """提取文本中的第一个数，返回Fraction，没有数时返回None"""
+    m = _NUMBER_RE.search(str(text).replace(',', '').replace('，', ''))
+    if not m:
+        return None
+    try:
+        return Fraction(m.group())
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def normalize_expression(expression):
+    """把AI给出的算式规范为Un.evaluate可计算的形式，无法计算时返回None"""
+    if not isinstance(expression, str):
+        return None
+    expr = re.sub(r'\s+', '', expression.translate(_EXPRESSION_TABLE))
+    # 允许写成 "23+19=42" 的形式，只取等号左边
+    expr = expr.split('=', 1)[0]
+    if not expr or len(expr) > MAX_EXPRESSION_LENGTH or not _EXPRESSION_RE.match(expr):
+        return None
+    return expr
+
+
+def verify_answer(expression, answer):
+    """用Un.evaluate校验算式的值是否等于答案中的数"""
+    expr = normalize_expression(expression)
+    value = parse_number(answer)
+    if expr is None or value is None:
+        return False
+    try:
+        return Un.evaluate(expr, str(value))
+    except ValueError:
+        return False
+
+
+def answers_match(user_answer, standard_answer):
+    """按数值比较学生答案和标准答案（42、42.0、42个 都算对），任一方没有数时返回None"""
+    user_value = parse_number(user_answer)
+    standard_value = parse_number(standard_answer)
+    if user_value is None or standard_value is None:
+        return None
+    return user_value == standard_value
+
+
+@lru_cache(maxsize=None)
+def _verify_pool():
+    # 校验放在线程池中，与流式接收和解析后续题目重叠进行
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="ai-question-verify")
+
 
 class AIApplicationQuestion:
-    def __init__(self):
-        pass
+    def __init__(self, deadline=30.0, hedge=True, batch_idle_timeout=60.0):
+        # deadline: 单次AI生成的硬性截止时间（秒），超时立即改用模板题
+        # hedge: 首个请求超过历史p90延迟时是否发起对冲请求
+        # batch_idle_timeout: 批量生成时超过该秒数没有新片段才放弃；推理模型先输出推理再输出JSON，
+        #   整批的总时长常超过deadline，因此不限制总时长
+        self.deadline = deadline
+        self.hedge = hedge
+        self.batch_idle_timeout = batch_idle_timeout
+        # 被丢弃的格式不正确的题目数
+        self.rejected = 0
+        # 算式与答案不一致而被丢弃的题目数
+        self.mismatched = 0
 
     def generate_question_and_answer(self):
         # 优先调用AI大模型API生成题目和答案
+        pair = self.generate_ai_question()
+        if pair is not None:
+            return pair
+        # 回退到模板生成
+        return self.generate_template_question()
+
+    def generate_ai_question(self):
+        """调用AI生成一道应用题，格式不正确、算式校验失败或调用失败时返回None"""
         try:
-            prompt = "请生成一道小学数学应用题，并给出标准答案，格式为：题目：xxx\n答案：yyy"
-            content = get_ai_response(prompt)
-            if "题目：" in content and "答案：" in content:
+            from API import get_ai_response_hedged
+            prompt = ("请生成一道小学数学应用题，并给出标准答案和列式，"
+                      "列式只能包含数字和+-*/()，格式为：题目：xxx\n答案：yyy\n算式：zzz")
+            # 应用题需要每次都不同，跳过回复缓存
+            content = get_ai_response_hedged(prompt, self.deadline, hedge=self.hedge, use_cache=False)
+            if content and "题目：" in content and "答案：" in content and "算式：" in content:
                 q = content.split("题目：",1)[1].split("答案：",1)
                 question = q[0].strip()
-                answer = q[1].strip()
-                return question, answer
+                answer, expression = (part.strip() for part in q[1].split("算式：", 1))
+                if question and answer:
+                    if verify_answer(expression, answer):
+                        return question, answer
+                    self.mismatched += 1
         except Exception as e:
             pass
-        # 回退到模板生成
-        templates = [
-            ("小明有{a}个苹果，又买了{b}个，现在有多少个苹果？", lambda a, b: a + b),
-            ("一辆汽车每小时行驶{a}公里，{b}小时后行驶了多少公里？", lambda a, b: a * b),
-            ("妈妈买了{a}个鸡蛋，做菜用了{b}个，还剩多少个？", lambda a, b: a - b),
-            ("一个长方形长{a}厘米，宽{b}厘米，面积是多少平方厘米？", lambda a, b: a * b),
-            ("一瓶水重{a}克，又加了{b}克，现在有多少克？", lambda a, b: a + b),
-            ("小红有{a}元钱，买了{b}元的文具，还剩多少钱？", lambda a, b: a - b),
-            ("一辆火车每小时行驶{a}公里，{b}小时后行驶了多少公里？", lambda a, b: a * b),
-            ("一根绳子长{a}米，剪去{b}米，还剩多少米？", lambda a, b: a - b),
-            ("一个班有{a}个男生，{b}个女生，班里共有多少人？", lambda a, b: a + b),
-            ("一桶油重{a}千克，倒出{b}千克，还剩多少千克？", lambda a, b: a - b),
-            ("小明买了{a}支铅笔，每支{b}元，一共花了多少钱？", lambda a, b: a * b),
-            ("一本书有{a}页，小明每天看{b}页，几天能看完？", lambda a, b: math.ceil(a / b)),
-        ]
-        idx = random.randint(0, len(templates)-1)
-        a = random.randint(5, 100)
-        b = random.randint(2, 30)
-        q_tpl, ans_func = templates[idx]
-        question = q_tpl.format(a=a, b=b)
-        answer = str(ans_func(a, b))
+        return None
+
+    def generate_ai_questions(self, n=5):
+        """一次请求让AI生成n道应用题（JSON数组），边接收边解析，逐道产出 (question, answer)
+
+        每道题单独校验：格式不正确的题目计入self.rejected，
+        算式（expression）经Un.evaluate计算与答案不一致的题目计入self.mismatched，都不会产出；
+        调用失败或超时（超过batch_idle_timeout秒没有新片段）时停止接收，已解析并提交校验的题目仍会产出。
+        """
+        from json_stream import JSONArrayStream
+        prompt = (
+            f"请生成{n}道不同的小学数学应用题，并给出标准答案和列式。"
+            '只输出一个JSON数组，不要输出其他内容，数组的每个元素格式为：'
+            '{"question": "题目", "answer": "答案", "expression": "只含数字和+-*/()的列式"}'
+        )
+        parser = JSONArrayStream()
+        # 已提交校验、按顺序等待结果的题目
+        pending = deque()
+        produced = 0
+        stream = None
+        try:
+            from API import stream_chat_with_ai
+            # 批量题目需要每次都不同，跳过回复缓存；推理片段不含题目，只解析回复内容
+            stream = stream_chat_with_ai(prompt, timeout=self.batch_idle_timeout, use_cache=False)
+            for kind, text in stream:
+                if kind != 'content':
+                    continue
+                for item in parser.feed(text):
+                    pair = self._validate_item(item)
+                    if pair is None:
+                        self.rejected += 1
+                        continue
+                    pending.append((pair, _verify_pool().submit(verify_answer, item.get("expression"), pair[1])))
+                # 已完成校验的题目立即产出，不等待整个回复结束
+                while pending and (pending[0][1].done() or parser.done):
+                    pair = self._take_verified(pending.popleft())
+                    if pair is not None:
+                        produced += 1
+                        yield pair
+                        if produced >= n:
+                            return
+                if parser.done:
+                    break
+        except Exception as e:
+            print(f"AI批量生成应用题失败: {e!r}")
+        finally:
+            # 提前结束时关闭流，取消后台请求
+            if stream is not None:
+                stream.close()
+            self.rejected += parser.errors
+        # 流正常结束或出错后，产出已提交校验的其余题目
+        while pending and produced < n:
+            pair = self._take_verified(pending.popleft())
+            if pair is not None:
+                produced += 1
+                yield pair
+
+    def _take_verified(self, entry):
+        pair, future = entry
+        try:
+            ok = future.result(timeout=VERIFY_TIMEOUT)
+        except Exception:
+            ok = False
+        if not ok:
+            self.mismatched += 1
+            return None
+        return pair
+
+    @staticmethod
+    def _validate_item(item):
+        # 每道题必须是包含非空题目和答案的对象，答案允许是数字
+        if not isinstance(item, dict):
+            return None
+        question = item.get("question")
+        answer = item.get("answer")
+        if not isinstance(question, str) or isinstance(answer, bool) or not isinstance(answer, (str, int, float)):
+            return None
+        question = question.strip()
+        answer = str(answer).strip()
+        if not question or not answer:
+            return None
+        return question, answer
+
+    def generate_worksheet(self, n):
+        """生成一整张练习卷的n道题，AI批量生成不足的部分用模板题补齐"""
+        pairs = list(self.generate_ai_questions(n))
+        while len(pairs) < n:
+            pairs.append(self.generate_template_question())
+        return pairs
+
+    def generate_template_question(self, target_diff=1100):
+        """使用本地模板引擎生成一道应用题，target_diff为目标难度（800-2000）"""
+        question, answer, _ = default_engine().generate_one(target_diff)
         return question, answer
+
+
+class QuestionPrefetchPool:
+    """后台预生成AI应用题的有界缓冲池
+
+    后台线程持续调用AI生成并校验题目，保持池中有size道可用题目；
+    batch_size大于1时每次请求批量生成多道题，每解析出一道就放入池中。
+    取题时直接从池中弹出，池为空时最多等待deadline秒，超时才回退到模板题。
+    """
+
+    def __init__(self, generator=None, size=3, retry_delay=5.0, batch_size=5):
+        self.generator = generator or AIApplicationQuestion()
+        self.size = size
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=size)
+        self._stop = threading.Event()
+        self._thread = None
+        self.hits = 0
+        self.fallbacks = 0
+
+    def start(self):
+        """启动后台生成线程（重复调用无副作用）"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._worker, name="ai-question-prefetch", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """停止后台生成线程"""
+        self._stop.set()
+
+    def _worker(self):
+        from API import get_config_error
+        error = get_config_error()
+        if error is not None:
+            # 未配置AI时不再预生成，取题时直接使用模板题
+            print(f"AI应用题预生成未启动: {error.message}")
+            return
+        while not self._stop.is_set():
+            if self.batch_size > 1:
+                batch = self.generator.generate_ai_questions(self.batch_size)
+            else:
+                pair = self.generator.generate_ai_question()
+                batch = [pair] if pair is not None else []
+            produced = 0
+            try:
+                for pair in batch:
+                    if not self._put(pair):
+                        return
+                    produced += 1
+            finally:
+                if hasattr(batch, 'close'):
+                    batch.close()
+            if not produced:
+                # 生成失败时等待一段时间再重试，避免频繁调用接口
+                self._stop.wait(self.retry_delay)
+
+    def _put(self, pair):
+        # 池满时阻塞等待，停止时返回False
+        while not self._stop.is_set():
+            try:
+                self._queue.put(pair, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def get(self, deadline=1.0):
+        """取出一道题目，返回 (question, answer)
+
+        Args:
+            deadline (float): 池为空时最多等待的秒数，超时后使用模板题
+        """
+        try:
+            pair = self._queue.get(timeout=deadline) if deadline > 0 else self._queue.get_nowait()
+            self.hits += 1
+            return pair
+        except queue.Empty:
+            self.fallbacks += 1
+            return self.generator.generate_template_question()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+ai_benchmark.py
+AI接口的延迟/吞吐量测量工具：默认启动本地模拟服务器，
+并发调用 get_ai_response / chat_with_ai / stream_chat_with_ai，
+报告首字延迟(TTFT)、总延迟分位数和吞吐量
+
+用法：python ai_benchmark.py --mode stream --requests 50 --concurrency 10
+      python ai_benchmark.py --base-url http://127.0.0.1:18080   # 使用已运行的服务器
+"""
+import argparse
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mock_llm_server import add_config_arguments, config_from_args, start_mock_server
+
+MODES = ('response', 'chat', 'stream')
+
+
+def _percentile(values, q):
+    if not values:
+        return float('nan')
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[q - 1]
+
+
+def _one_request(mode, i):
+    import API
+    prompt = f"基准测试请求 {i}"
+    start = time.perf_counter()
+    ttft = None
+    chars = 0
+    ok = True
+    if mode == 'response':
+        reply = API.get_ai_response(prompt, use_cache=False)
+        ok = not reply.startswith("API调用错误")
+        chars = len(reply)
+    elif mode == 'chat':
+        content, reasoning = API.chat_with_ai(prompt, use_cache=False)
+        ok = not content.startswith("AI回复出错")
+        chars = len(content) + len(reasoning)
+    else:
+        try:
+            for _, text in API.stream_chat_with_ai(prompt, use_cache=False):
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                chars += len(text)
+        except Exception:
+            ok = False
+    total = time.perf_counter() - start
+    return {'ok': ok, 'ttft': ttft if ttft is not None else total, 'total': total, 'chars': chars}
+
+
+def run_benchmark(mode='stream', requests=20, concurrency=5):
+    """按给定并发数发送requests个请求，返回统计结果"""
+    # 预热：建立连接并加载配置，不计入结果
+    _one_request(mode, -1)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: _one_request(mode, i), range(requests)))
+    wall = time.perf_counter() - start
+    succeeded = [r for r in results if r['ok']]
+    ttfts = sorted(r['ttft'] for r in succeeded)
+    totals = sorted(r['total'] for r in succeeded)
+    return {
+        'mode': mode,
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': requests - len(succeeded),
+        'wall_time': wall,
+        'ttft_p50': _percentile(ttfts, 50),
+        'ttft_p90': _percentile(ttfts, 90),
+        'latency_p50': _percentile(totals, 50),
+        'latency_p90': _percentile(totals, 90),
+        'latency_p99': _percentile(totals, 99),
+        'requests_per_second': requests / wall if wall else 0.0,
+        'chars_per_second': sum(r['chars'] for r in succeeded) / wall if wall else 0.0,
+    }
+
+
+def format_report(stats):
+    return (
+        f"模式={stats['mode']} 请求数={stats['requests']} 并发={stats['concurrency']} 错误={stats['errors']}\n"
+        f"  TTFT      p50={stats['ttft_p50'] * 1000:.1f}ms  p90={stats['ttft_p90'] * 1000:.1f}ms\n"
+        f"  总延迟    p50={stats['latency_p50'] * 1000:.1f}ms  p90={stats['latency_p90'] * 1000:.1f}ms  "
+        f"p99={stats['latency_p99'] * 1000:.1f}ms\n"
+        f"  吞吐量    {stats['requests_per_second']:.2f} 请求/秒  {stats['chars_per_second']:.0f} 字符/秒  "
+        f"总耗时 {stats['wall_time']:.2f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI接口延迟/吞吐量测量")
+    parser.add_argument('--mode', choices=MODES + ('all',), default='all')
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=5)
+    parser.add_argument('--base-url', default=None, help="已运行的OpenAI兼容服务器地址，不指定时启动本地模拟服务器")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    if args.base_url is None:
+        server = start_mock_server(config=config_from_args(args))
+        args.base_url = server.url
+        os.environ.setdefault('OPENAI_API_KEY', 'mock-key')
+    # 必须在首次调用API之前设置，API.get_config() 会缓存配置
+    os.environ['OPENAI_BASE_URL'] = args.base_url
+    os.environ['AI_CACHE'] = '0'
+
+    for mode in (MODES if args.mode == 'all' else (args.mode,)):
+        print(format_report(run_benchmark(mode, args.requests, args.concurrency)))
+    import API
+    usage = API.prompt_usage_stats()
+    if usage['calls']:
+        print(f"提示token：平均每次 {usage['prompt_tokens_per_call']:.0f}，"
+              f"服务端缓存命中 {usage['cached_fraction'] * 100:.1f}%")
+    if server is not None:
+        print(f"模拟服务器：收到 {server.requests} 个请求，注入 {server.errors} 个错误")
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
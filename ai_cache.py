@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+ai_cache.py
+AI回复的磁盘缓存模块：基于SQLite，支持过期时间(TTL)和按条数的LRU淘汰，
+可被多个进程同时访问
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class ResponseCache:
+    """以 (model, system_prompt, messages) 的哈希为键的持久化回复缓存"""
+
+    def __init__(self, path, ttl=7 * 24 * 3600, max_entries=2000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._init_db()
+
+    @staticmethod
+    def make_key(model, system_prompt, messages):
+        """根据模型、系统提示和消息列表计算缓存键"""
+        payload = json.dumps([model, system_prompt, messages],
+                             ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _conn(self):
+        # sqlite连接不能跨线程共享，每个线程各自持有一个连接
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        self._conn().execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn().execute(
+            "CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+
+    def get(self, key):
+        """读取缓存，未命中或已过期时返回None"""
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None and now - row[1] > self.ttl:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            row = None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        """写入缓存，超过容量时按最近访问时间淘汰最旧的条目"""
+        now = time.time()
+        conn = self._conn()
+        # BEGIN IMMEDIATE 获取写锁，保证多进程并发写入时插入与淘汰的原子性
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now))
+            conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            count = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                cur = conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                    (count - self.max_entries,))
+                with self._lock:
+                    self.evictions += cur.rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def clear(self):
+        """清空缓存"""
+        self._conn().execute("DELETE FROM responses")
+
+    def stats(self):
+        """返回命中/未命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+def default_cache_path():
+    return os.getenv('AI_CACHE_PATH',
+                     os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ai_cache.sqlite3'))
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+chat_history.py
+按token预算管理AI问答的对话历史：逐条缓存token估算值，
+超出预算时从最早的对话开始淘汰，可选地把淘汰内容滚动汇总为摘要
+"""
+import re
+from collections import deque
+from functools import lru_cache
+
+# 中日韩字符大约每字一个token，其余字符大约每4个一个token
+_CJK_PATTERN = r'[　-〿㐀-䶿一-鿿＀-￯]'
+# 每条消息的角色、分隔符等固定开销
+MESSAGE_OVERHEAD = 4
+
+
+@lru_cache(maxsize=None)
+def _cjk_re():
+    # 字符范围很大，编译需要几毫秒，第一次估算时才编译，不拖慢程序启动
+    return re.compile(_CJK_PATTERN)
+
+
+def estimate_tokens(text):
+    """粗略估算文本的token数（不依赖分词器）"""
+    if not text:
+        return 0
+    cjk = len(_cjk_re().findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_summarizer(summary, evicted, limit=300):
+    """默认的本地摘要方式：保留被淘汰的用户提问要点，不调用AI
+
+    Args:
+        summary (str): 之前的摘要
+        evicted (list): 被淘汰的消息
+        limit (int): 摘要最大字符数，超出时丢弃最早的内容
+    """
+    points = [m['content'][:40] for m in evicted if m['role'] == 'user']
+    if not points:
+        return summary
+    text = '；'.join(filter(None, [summary] + points))
+    return text[-limit:]
+
+
+class ChatHistory:
+    """token预算内的对话滑动窗口
+
+    Args:
+        token_budget (int): 历史消息（含摘要）的token上限
+        summarizer (callable, optional): summarizer(summary, evicted) -> str，
+            为None时直接丢弃被淘汰的对话
+    """
+
+    def __init__(self, token_budget=3000, summarizer=None):
+        self.token_budget = token_budget
+        self.summarizer = summarizer
+        self.summary = ''
+        self._summary_tokens = 0
+        # (message, tokens) 对，token数在加入时计算一次
+        self._items = deque()
+        self._total = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def total_tokens(self):
+        """当前窗口（含摘要）的token数"""
+        return self._total + self._summary_tokens
+
+    def add(self, role, content, trim=True):
+        """追加一条消息，必要时淘汰最早的消息"""
+        message = {"role": role, "content": content}
+        tokens = estimate_tokens(content) + MESSAGE_OVERHEAD
+        self._items.append((message, tokens))
+        self._total += tokens
+        if trim:
+            self._trim()
+
+    def add_turn(self, user_message, assistant_message):
+        """追加一轮问答（整轮加入后再淘汰，避免拆散同一轮的问和答）"""
+        self.add("user", user_message, trim=False)
+        self.add("assistant", assistant_message, trim=False)
+        self._trim()
+
+    def _pop_turn(self):
+        # 按轮淘汰：弹出最早的消息及紧随其后的助手回复，使窗口始终以用户消息开头
+        message, tokens = self._items.popleft()
+        self._total -= tokens
+        evicted = [message]
+        if self._items and self._items[0][0]["role"] == "assistant":
+            message, tokens = self._items.popleft()
+            self._total -= tokens
+            evicted.append(message)
+        return evicted
+
+    def _trim(self):
+        # 至少保留最新的一轮问答
+        while self.total_tokens > self.token_budget and len(self._items) > 2:
+            evicted = self._pop_turn()
+            if self.summarizer:
+                self._set_summary(self.summarizer(self.summary, evicted))
+
+    def _set_summary(self, summary):
+        # 摘要最多占预算的四分之一，超出部分丢弃最早的内容
+        limit = self.token_budget // 4
+        while summary and estimate_tokens(summary) > limit:
+            summary = summary[len(summary) // 8 + 1:]
+        self.summary = summary
+        # 摘要以一问一答两条消息的形式发送
+        self._summary_tokens = estimate_tokens(summary) + 2 * MESSAGE_OVERHEAD + 2 if summary else 0
+
+    def messages(self):
+        """返回发送给模型的历史消息列表（不含系统提示）"""
+        result = []
+        if self.summary:
+            result.append({"role": "user", "content": f"（之前对话的摘要：{self.summary}）"})
+            result.append({"role": "assistant", "content": "好的。"})
+        result.extend(message for message, _ in self._items)
+        return result
+
+    def clear(self):
+        self._items.clear()
+        self._total = 0
+        self.summary = ''
+        self._summary_tokens = 0
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+homework_cli.py
+不需要图形界面的命令行入口：只导入 homework_logic 和 Un，不加载 PyQt5 和AI模块，
+可以在服务器上做练习、批量判分和推荐算法的模拟测试
+
+用法：python homework_cli.py practice                    # 交互练习，输入 q 退出
+      python homework_cli.py grade answers.txt            # 每行 "题目<Tab>答案"，- 表示标准输入
+      python homework_cli.py simulate --answers 10000 --skill 1500 --seed 1
+"""
+import argparse
+import random
+import sys
+import time
+
+from homework_logic import Homework, Question
+
+
+def _display(text):
+    return text.replace('*', '×').replace('/', '÷')
+
+
+def _normalize(text):
+    return text.strip().replace('×', '*').replace('÷', '/')
+
+
+def grade_answer(hw, q, answer):
+    """判断答案是否正确，答案格式无效时返回None"""
+    try:
+        return hw.evaluate_answer(q, _normalize(answer))
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def practice(hw, stdin=sys.stdin, stdout=sys.stdout):
+    """交互练习：逐题作答并按用时更新学力，输入 q 或遇到输入结束时退出，返回 (答题数, 答对数)"""
+    answered = correct_count = 0
+    while hw.cur_q is not None:
+        q = hw.cur_q
+        print(f"\n学力：{hw.student['rating']:.2f}  难度：{q.diff}  时限：{q.limit}秒", file=stdout)
+        print(_display(q.q), file=stdout)
+        stdout.write("答案> ")
+        stdout.flush()
+        start = time.monotonic()
+        line = stdin.readline()
+        if not line or line.strip().lower() == 'q':
+            break
+        if not line.strip():
+            continue
+        correct = grade_answer(hw, q, line)
+        if correct is None:
+            print("无效的答案格式！", file=stdout)
+            continue
+        hw.update_rating(q, correct, time.monotonic() - start)
+        answered += 1
+        correct_count += bool(correct)
+        print("正确" if correct else "错误", file=stdout)
+        hw.recommend(correct)
+    else:
+        print("没有更多题目！", file=stdout)
+    print(f"\n共答题 {answered} 道，答对 {correct_count} 道，学力：{hw.student['rating']:.2f}", file=stdout)
+    return answered, correct_count
+
+
+def grade_file(hw, lines, stdout=sys.stdout):
+    """批量判分：每行 "题目<Tab>答案"，空行和 # 开头的行忽略，返回 (正确数, 错误数, 无效行数)"""
+    counts = {True: 0, False: 0, None: 0}
+    for lineno, line in enumerate(lines, 1):
+        line = line.rstrip('\r\n')
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        question, sep, answer = line.rpartition('\t')
+        if not sep or not question.strip():
+            print(f"{lineno}\t无效\t缺少题目或答案", file=stdout)
+            counts[None] += 1
+            continue
+        text = _normalize(question)
+        q = Question(0, 0, text, 0)
+        if not hw.is_valid_question(text):
+            result = None
+        else:
+            result = grade_answer(hw, q, answer)
+        label = '无效' if result is None else '正确' if result else '错误'
+        print(f"{lineno}\t{label}\t{question}\t{answer.strip()}", file=stdout)
+        counts[result] += 1
+    total = counts[True] + counts[False]
+    accuracy = counts[True] / total * 100 if total else 0.0
+    print(f"正确 {counts[True]}，错误 {counts[False]}，无效 {counts[None]}，正确率 {accuracy:.1f}%", file=stdout)
+    return counts[True], counts[False], counts[None]
+
+
+def simulate(hw, answers=1000, skill=1500, seed=None, report_every=None, stdout=sys.stdout):
+    """模拟一个真实水平为skill的学生连续答题，答对概率按Elo期望得分计算
+
+    用于检验学力收敛情况和推荐的速度，返回统计结果。
+    """
+    rand = random.Random(seed)
+    report_every = report_every or max(1, answers // 10)
+    answered = correct_count = 0
+    start = time.perf_counter()
+    while answered < answers and hw.cur_q is not None:
+        q = hw.cur_q
+        p = 1 / (1 + 10 ** ((q.diff - skill) / 400))
+        correct = rand.random() < p
+        hw.update_rating(q, correct, rand.uniform(3, 15))
+        answered += 1
+        correct_count += correct
+        hw.recommend(correct)
+        if answered % report_every == 0:
+            print(f"第 {answered} 题  学力 {hw.student['rating']:.1f}  题库 {len(hw.q_bank)} 道", file=stdout)
+    elapsed = time.perf_counter() - start
+    stats = {
+        'answers': answered,
+        'correct': correct_count,
+        'rating': hw.student['rating'],
+        'bank_size': len(hw.q_bank),
+        'answers_per_second': answered / elapsed if elapsed else 0.0,
+    }
+    print(f"共 {stats['answers']} 题，答对 {stats['correct']} 题，最终学力 {stats['rating']:.1f}"
+          f"（真实水平 {skill}），题库 {stats['bank_size']} 道，{stats['answers_per_second']:.0f} 题/秒", file=stdout)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="作业推荐命令行工具")
+    parser.add_argument('--rating', type=float, default=None, help="初始学力（800-2000）")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('practice', help="交互练习")
+    grade = sub.add_parser('grade', help="批量判分")
+    grade.add_argument('file', help="每行 \"题目<Tab>答案\" 的UTF-8文本文件，- 表示标准输入")
+    sim = sub.add_parser('simulate', help="模拟学生答题")
+    sim.add_argument('--answers', type=int, default=1000)
+    sim.add_argument('--skill', type=float, default=1500, help="模拟学生的真实水平")
+    sim.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    hw = Homework()
+    if args.rating is not None:
+        hw.student['rating'] = max(800, min(2000, args.rating))
+        hw.cur_q = hw.next_question()
+
+    if args.command == 'practice':
+        practice(hw)
+    elif args.command == 'grade':
+        if args.file == '-':
+            _, _, invalid = grade_file(hw, sys.stdin)
+        else:
+            try:
+                with open(args.file, encoding='utf-8-sig') as f:
+                    _, _, invalid = grade_file(hw, f)
+            except OSError as e:
+                parser.exit(2, f"无法读取文件：{e}\n")
+        # 有无法判分的行时返回非零，便于脚本检查输入文件
+        return 1 if invalid else 0
+    else:
+        simulate(hw, args.answers, args.skill, args.seed)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
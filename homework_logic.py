@@ -3,16 +3,35 @@ from sortedcontainers import SortedList
 import Un
 from fractions import Fraction
 from collections import defaultdict
-Question = namedtuple('Question', ['id', 'diff', 'q', 'limit'])
+from itertools import islice
+import question_templates
+import question_generator
+# answer: 应用题等无法由题面直接计算的题目的标准答案，四则运算和方程题为None
+Question = namedtuple('Question', ['id', 'diff', 'q', 'limit', 'answer'], defaults=(None,))
+
+
+def time_limit(diff):
+    """按难度给出答题时限，难度越高时限越长"""
+    return 10 + (diff - 800) // 60
+
 
 class Homework:
+    # 当前学力附近 ±REFILL_WINDOW 内未做过的题目少于 REFILL_THRESHOLD 道时，补充 REFILL_BATCH 道
+    REFILL_WINDOW = 150
+    REFILL_THRESHOLD = 5
+    REFILL_BATCH = 10
+
     def __init__(self):
         self.flag=defaultdict(int)
         self.student = {"name": "张三", "rating": 1000}
+        self.xuanti=defaultdict(bool)
         self.q_bank = None
         self.update_q_bank()
-        self.cur_q = self.q_bank[0]
-        self.xuanti=defaultdict(bool)
+        # 用本地模板引擎补充应用题，不依赖AI也有足够的题目
+        self.add_template_questions(100)
+        # 惰性的程序化题目流，每次取题时按当前学力生成
+        self._generated = question_generator.stream(lambda: self.student["rating"])
+        self.cur_q = self.next_question()
 
     def update_q_bank(self):
         question_list = [
@@ -36,7 +55,34 @@ class Homework:
             Question(19, 1500, "6 - 3x =10", 20),
         ]
 
-        self.q_bank = SortedList(question_list, key=lambda q: abs(q.diff - self.student["rating"]))
+        # 按难度排序；学力附近的题目通过二分查找定位，学力变化不影响排序
+        self.q_bank = SortedList(question_list, key=lambda q: q.diff)
+        # 还没有做对的题目，推荐时只在其中查找，已做对的题目再多也不影响推荐速度
+        self._open = SortedList(question_list, key=lambda q: q.diff)
+        # id -> Question 索引，按id查找题目不需要遍历题库
+        self._by_id = {q.id: q for q in question_list}
+        self.next_id = max(q.id for q in question_list) + 1
+
+    def _add_questions(self, questions):
+        # 所有加入题库的途径（手动添加、模板批量生成、程序化补充）都经过这里，保证索引同步
+        self.q_bank.update(questions)
+        self._open.update(questions)
+        self._by_id.update((q.id, q) for q in questions)
+
+    def get_question(self, question_id):
+        """按id取题目，不存在时返回None"""
+        return self._by_id.get(question_id)
+
+    def add_template_questions(self, n, target_diff=None):
+        """用模板引擎批量生成n道应用题加入题库，target_diff为None时难度在800-2000内均匀分布"""
+        generated = question_templates.generate(n, target_diff)
+        questions = []
+        for g in generated:
+            # 难度越高，答题时限越长
+            questions.append(Question(self.next_id, g.diff, g.question, time_limit(g.diff), g.answer))
+            self.next_id += 1
+        self._add_questions(questions)
+        return questions
 
     def add_question(self, question_text, difficulty):
         """添加新题目，并验证题目是否符合要求"""
@@ -44,7 +90,7 @@ class Homework:
             raise ValueError("题目不符合要求，只能添加整分数的四则运算或一元一次方程的题目。")
 
         new_question = Question(self.next_id, difficulty, question_text, 30)
-        self.q_bank.add(new_question)
+        self._add_questions([new_question])
         self.next_id += 1
 
     def is_valid_question(self, question_text):
@@ -66,17 +112,53 @@ class Homework:
                 return False
 
 
+    def _available(self, q):
+        # 没有做对过、也不是从筛选页手动选过的题目
+        return not self.flag[q.id] and not self.xuanti[q.id]
+
+    def _nearest(self, rating):
+        """按与学力的差距由近到远产出没有做对的题目"""
+        bank = self._open
+        hi = bank.bisect_key_left(rating)
+        lo = hi - 1
+        while lo >= 0 or hi < len(bank):
+            if hi >= len(bank) or (lo >= 0 and rating - bank[lo].diff <= bank[hi].diff - rating):
+                yield bank[lo]
+                lo -= 1
+            else:
+                yield bank[hi]
+                hi += 1
+
+    def refill(self):
+        """当前学力附近可做的题目不足时，用程序化生成器补充，返回新增的题目"""
+        rating = self.student["rating"]
+        window = self._open.irange_key(rating - self.REFILL_WINDOW, rating + self.REFILL_WINDOW)
+        available = 0
+        for q in window:
+            if self._available(q):
+                available += 1
+                if available >= self.REFILL_THRESHOLD:
+                    return []
+        questions = []
+        for g in islice(self._generated, self.REFILL_BATCH):
+            questions.append(Question(self.next_id, g.diff, g.question, time_limit(g.diff)))
+            self.next_id += 1
+        self._add_questions(questions)
+        return questions
+
+    def next_question(self):
+        """返回与当前学力最接近的可做题目，必要时先补充题库"""
+        self.refill()
+        for q in self._nearest(self.student["rating"]):
+            if self._available(q):
+                return q
+        return None
+
     def recommend(self, correct):
-        j=0
         if correct:
             self.flag[self.cur_q.id]=1
-            if self.xuanti[self.cur_q.id]:self.cur_q=self.q_bank[0]
-            while self.flag[self.cur_q.id]==1:
-                j+=1
-                self.cur_q=self.q_bank[j]
-            while self.xuanti[self.cur_q.id]:
-                j+=1
-                self.cur_q=self.q_bank[j]
+            self._open.discard(self.cur_q)
+            self.cur_q = self.next_question()
         return self.cur_q
 
     def update_rating(self, q, correct, time_taken):
@@ -88,15 +170,26 @@ class Homework:
         reward = 30 * time_factor * (1 - e) if correct else -max(min_penalty, 30 * e) * time_factor
         self.student["rating"] = max(800, min(2000, self.student["rating"] + reward))
 
-    def search_by_diff(self, diff_min=None, diff_max=None):
+    def diff_bounds(self, diff_min=None, diff_max=None):
+        """返回难度在[diff_min, diff_max]内的题目在q_bank中的下标范围 (start, end)"""
+        start_index = self.q_bank.bisect_key_left(diff_min) if diff_min is not None else 0
+        end_index = self.q_bank.bisect_key_right(diff_max) if diff_max is not None else len(self.q_bank)
+        return start_index, max(start_index, end_index)
 
-        start_index = self.q_bank.bisect_left(Question(0, diff_min, '', 0)) if diff_min is not None else 0
-        end_index = self.q_bank.bisect_right(Question(0, diff_max, '', 0)) if diff_max is not None else len(self.q_bank)
+    def search_by_diff(self, diff_min=None, diff_max=None):
+        start_index, end_index = self.diff_bounds(diff_min, diff_max)
         return list(self.q_bank[start_index:end_index])
 
     def evaluate_answer(self, q, user_answer):
+        """判断答案是否正确，q可以是题目或题目id"""
+        if not isinstance(q, Question):
+            q = self.get_question(q)
+            if q is None:
+                raise ValueError("题目不存在")
         user_answer=Fraction(user_answer)
         try:
+            if q.answer is not None:
+                return user_answer == Fraction(q.answer)
             if 'x' in q.q:
                 return user_answer == Un.solve_equation(q.q)
             
@@ -105,5 +198,5 @@ class Homework:
 
         except Exception as e:
             print(f"错误：{e}")
-            return False, None
+            return False
 
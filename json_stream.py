@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+json_stream.py
+增量解析流式返回的JSON数组：每收到一个片段，立即产出其中已经完整的顶层元素，
+不必等待整个回复结束；单个元素格式错误只丢弃该元素，不影响其余元素
+"""
+import json
+
+
+class JSONArrayStream:
+    """JSON数组的流式解析器
+
+    数组开始前的文字（如模型输出的说明、```json 代码块标记）和数组结束后的内容都会被忽略。
+
+    用法：
+        parser = JSONArrayStream()
+        for chunk in chunks:
+            for item in parser.feed(chunk):
+                ...
+    """
+
+    def __init__(self):
+        self._item = []          # 当前元素已收到的字符
+        self._depth = 0          # 0: 数组外；1: 数组内元素之间；>1: 元素内部的嵌套层级
+        self._in_string = False
+        self._escape = False
+        self.done = False        # 已读到数组的结束符
+        self.items = 0           # 成功解析的元素数
+        self.errors = 0          # 无法解析而被丢弃的元素数
+
+    def feed(self, chunk):
+        """输入一个片段，返回本片段中新完成的元素列表"""
+        completed = []
+        if self.done:
+            return completed
+        item = self._item
+        for c in chunk:
+            if self._depth == 0:
+                # 跳过数组开始前的内容
+                if c == '[':
+                    self._depth = 1
+                continue
+            if self._in_string:
+                item.append(c)
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                continue
+            if self._depth == 1 and c in ',]':
+                self._finish(completed)
+                if c == ']':
+                    self.done = True
+                    break
+                continue
+            if c == '"':
+                self._in_string = True
+            elif c in '[{':
+                self._depth += 1
+            elif c in ']}' and self._depth > 1:
+                self._depth -= 1
+            item.append(c)
+        return completed
+
+    def _finish(self, completed):
+        text = ''.join(self._item).strip()
+        self._item.clear()
+        if not text:
+            return
+        try:
+            completed.append(json.loads(text))
+            self.items += 1
+        except ValueError:
+            self.errors += 1
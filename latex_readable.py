@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+latex_readable.py
+将AI回复中的LaTeX数学公式转换为易读文本
+所有正则在导入时预编译，转换只做一遍组合匹配加一遍空白清理；
+LatexStreamConverter 支持对流式片段做增量转换
+"""
+import re
+
+# 命令名到符号的映射（前缀匹配，与原实现一致，例如 \rightarrow 中的 \right 也会被移除）
+_SYMBOLS = {
+    'sum_': '∑',
+    'prod_': '∏',
+    'int_': '∫',
+    'infty': '∞',
+    'pi': 'π',
+    'alpha': 'α',
+    'beta': 'β',
+    'gamma': 'γ',
+    'delta': 'δ',
+    'theta': 'θ',
+    'lambda': 'λ',
+    'mu': 'μ',
+    'sigma': 'σ',
+    'omega': 'ω',
+    'leq': '≤',
+    'geq': '≥',
+    'neq': '≠',
+    'approx': '≈',
+    'times': '×',
+    'div': '÷',
+    'pm': '±',
+    'cdot': '·',
+    'left': '',
+    'right': '',
+}
+
+# 长命令名优先，避免 \pi 抢先匹配 \pm 之类的情况
+_SYMBOL_NAMES = '|'.join(re.escape(name) for name in sorted(_SYMBOLS, key=len, reverse=True))
+
+_TOKEN_RE = re.compile(
+    r'(?P<newline>\\\\)'
+    r'|\\frac\{(?P<num>[^{}]+)\}\{(?P<den>[^{}]+)\}'
+    r'|\\sqrt\{(?P<sqrt>[^{}]+)\}'
+    r'|(?<![\\^])\^\{(?P<sup>[^{}]+)\}'
+    r'|(?<![\\_])_\{(?P<sub>[^{}]+)\}'
+    r'|(?P<delim>\${1,2}|\\\(|\\\)|\\begin\{[^}]+\}|\\end\{[^}]+\})'
+    r'|\\(?P<sym>' + _SYMBOL_NAMES + r')'
+)
+_SYMBOL_RE = re.compile(r'\\(' + _SYMBOL_NAMES + r')')
+_NESTED_RE = re.compile(r'\\frac\{|\\sqrt\{|\^\{|_\{')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def _symbols(text):
+    return _SYMBOL_RE.sub(lambda m: _SYMBOLS[m.group(1)], text)
+
+
+def _replace(m):
+    kind = m.lastgroup
+    if kind == 'sym':
+        return _SYMBOLS[m.group('sym')]
+    if kind == 'delim':
+        return ''
+    if kind == 'newline':
+        return '\n'
+    if kind == 'den':
+        return f"({_symbols(m.group('num'))})/({_symbols(m.group('den'))})"
+    if kind == 'sqrt':
+        return f"√({_symbols(m.group('sqrt'))})"
+    if kind == 'sup':
+        return f"^({_symbols(m.group('sup'))})"
+    return f"_({_symbols(m.group('sub'))})"
+
+
+def _convert(text):
+    text = _TOKEN_RE.sub(_replace, text)
+    # 嵌套结构（如 \sqrt{\frac{1}{2}}）由内向外每遍展开一层，通常不会进入该循环
+    while _NESTED_RE.search(text):
+        converted = _TOKEN_RE.sub(_replace, text)
+        if converted == text:
+            break
+        text = converted
+    return _SPACE_RE.sub(' ', text)
+
+
+def convert_latex_to_readable(text):
+    """将LaTeX数学公式转换为更易读的格式，处理$...$、\\(...\\)、\\begin{...}...\\end{...}等结构
+    Args:
+        text (str): 包含LaTeX代码的文本
+    Returns:
+        str: 转换后的易读文本
+    """
+    if not isinstance(text, str):
+        return text
+    return _convert(text).strip()
+
+
+# 片段末尾可能尚未完整的结构：未写完的命令、结尾的^/_、缺少第二个参数的\frac、结尾空白
+_PENDING_TAIL_RE = re.compile(r'(\\+[a-zA-Z]*_?|[\^_]|\\frac\{[^{}]*\}|\s+)$')
+_OWNER_RE = re.compile(r'\\(?:frac|sqrt|begin|end)\{?|[\^_]\{?')
+
+
+class LatexStreamConverter:
+    """流式增量转换：保留可能跨片段的未完整结构，其余部分立即转换输出
+
+    用法：每收到一个片段调用 feed()，结束时调用 flush()，
+    拼接所有返回值等价于对完整文本调用 convert_latex_to_readable()。
+    """
+
+    # 未闭合结构最多保留的字符数，超过后强制输出，避免异常输入导致无限缓冲
+    MAX_PENDING = 512
+
+    def __init__(self):
+        self._pending = ''
+        self._started = False
+        self._space_held = False
+
+    def _safe_cut(self, buf):
+        cut = len(buf)
+        # 最外层未闭合的 { 及其所属命令都要保留
+        opened = []
+        for i, c in enumerate(buf):
+            if c == '{':
+                opened.append(i)
+            elif c == '}' and opened:
+                opened.pop()
+        if opened:
+            i = opened[0]
+            cut = i
+            for m in _OWNER_RE.finditer(buf, max(0, i - 64), i + 1):
+                cut = m.start()
+        m = _PENDING_TAIL_RE.search(buf, 0, cut)
+        if m:
+            cut = m.start()
+        if len(buf) - cut > self.MAX_PENDING:
+            cut = len(buf)
+        return cut
+
+    def _emit(self, text):
+        # 转换后末尾的空白先不输出，等后面有非空白内容时再补上，文本结束时丢弃
+        text = _convert(text)
+        if not self._started:
+            text = text.lstrip()
+        elif self._space_held and text and not text.startswith(' '):
+            text = ' ' + text
+        body = text.rstrip()
+        if body:
+            self._started = True
+            self._space_held = len(body) < len(text)
+        elif text:
+            self._space_held = True
+        return body
+
+    def feed(self, chunk):
+        """输入一个片段，返回可以安全输出的已转换文本"""
+        buf = self._pending + chunk
+        cut = self._safe_cut(buf)
+        self._pending = buf[cut:]
+        return self._emit(buf[:cut]) if cut else ''
+
+    def flush(self):
+        """输入结束，返回剩余的已转换文本"""
+        buf, self._pending = self._pending, ''
+        return self._emit(buf)
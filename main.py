@@ -1,10 +1,27 @@
 # -*- coding: utf-8 -*-
-from PyQt5.QtWidgets import QApplication
 import sys
-from test import App
+# 最先导入，作为启动计时的起点
+from startup_profile import profiler, FIRST_QUESTION
+
+
+def main(argv):
+    # --profile-startup[=json] 打印启动分析报告；--exit-after-first-question 首题显示后退出（回归检查用）
+    for arg in argv[1:]:
+        if arg.startswith('--profile-startup'):
+            profiler.enable(arg.partition('=')[2] or 'text')
+    with profiler.span('导入界面模块'):
+        from PyQt5.QtWidgets import QApplication
+        from test import App
+    with profiler.span('QApplication'):
+        app = QApplication(argv)
+    with profiler.span('App()'):
+        window = App()
+    with profiler.span('show()'):
+        window.show()
+    if '--exit-after-first-question' in argv:
+        profiler.on_mark(FIRST_QUESTION, app.quit)
+    return app.exec_()
+
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    window = App()
-    window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    sys.exit(main(sys.argv))
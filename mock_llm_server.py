@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+mock_llm_server.py
+本地OpenAI兼容的模拟大模型服务器，用于离线测试和性能测量AI功能
+支持可配置的首字延迟、长尾延迟、生成速度、流式分块大小、reasoning_content推理片段和错误注入；
+模拟服务端提示缓存：首条消息与之前的请求相同时，其token数计入usage中的cached_tokens
+
+用法：python mock_llm_server.py --port 18080 --latency 0.5 --tokens-per-second 50
+然后设置环境变量 OPENAI_BASE_URL=http://127.0.0.1:18080
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REASONING = "题目要求求和。先算个位，再算十位。检查进位。"
+DEFAULT_CONTENT = "题目：小明有23个苹果，又买了19个，现在有多少个苹果？\n答案：42"
+
+
+@dataclass
+class MockLLMConfig:
+    latency: float = 0.5             # 收到请求到第一个片段的延迟（秒）
+    tail_rate: float = 0.0           # 出现长尾延迟的概率
+    tail_latency: float = 5.0        # 长尾请求的延迟（秒）
+    tokens_per_second: float = 100.0  # 生成速度，0表示不限速
+    chunk_size: int = 4              # 每个流式片段包含的字符数
+    reasoning: str = DEFAULT_REASONING  # 推理内容，为空时不发送reasoning_content
+    content: str = DEFAULT_CONTENT   # 回复内容
+    error_rate: float = 0.0          # 注入错误的概率
+    error_status: int = 500          # 注入错误时返回的HTTP状态码
+    seed: int = None
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, _Handler)
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.prefixes = set()  # 见过的首条消息，模拟提示缓存
+
+    def handle_error(self, request, client_address):
+        # 客户端取消请求（如对冲请求落选）导致的断开属于正常情况，不打印堆栈
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        config = server.config
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._send_json(400, {"error": {"message": "invalid json"}})
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            return self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+        with server.lock:
+            server.requests += 1
+            inject_error = server.random.random() < config.error_rate
+            if inject_error:
+                server.errors += 1
+            slow = server.random.random() < config.tail_rate
+        time.sleep(config.tail_latency if slow else config.latency)
+        if inject_error:
+            return self._send_json(config.error_status, {"error": {"message": "injected error", "type": "server_error"}})
+
+        if body.get('stream'):
+            self._stream(body, config)
+        else:
+            self._complete(body, config)
+
+    def _usage(self, body, config):
+        messages = body.get('messages', [])
+        prompt_chars = sum(len(str(m.get('content', ''))) for m in messages)
+        completion = len(config.reasoning) + len(config.content)
+        cached = 0
+        if messages:
+            prefix = json.dumps(messages[0], ensure_ascii=False, sort_keys=True)
+            with self.server.lock:
+                if prefix in self.server.prefixes:
+                    cached = len(str(messages[0].get('content', '')))
+                self.server.prefixes.add(prefix)
+        return {"prompt_tokens": prompt_chars, "completion_tokens": completion,
+                "total_tokens": prompt_chars + completion,
+                "prompt_tokens_details": {"cached_tokens": cached}}
+
+    def _pace(self, chars, config):
+        if config.tokens_per_second > 0:
+            time.sleep(chars / config.tokens_per_second)
+
+    def _complete(self, body, config):
+        self._pace(len(config.reasoning) + len(config.content), config)
+        message = {"role": "assistant", "content": config.content}
+        if config.reasoning:
+            message["reasoning_content"] = config.reasoning
+        self._send_json(200, {
+            "id": "mock-completion",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get('model', 'mock'),
+            "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+            "usage": self._usage(body, config),
+        })
+
+    def _stream(self, body, config):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        size = max(1, config.chunk_size)
+        for field, text in (("reasoning_content", config.reasoning), ("content", config.content)):
+            for i in range(0, len(text), size):
+                piece = text[i:i + size]
+                self._pace(len(piece), config)
+                self._send_event({
+                    "id": "mock-stream",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get('model', 'mock'),
+                    "choices": [{"index": 0, "delta": {field: piece}, "finish_reason": None}],
+                })
+        if (body.get('stream_options') or {}).get('include_usage'):
+            self._send_event({
+                "id": "mock-stream",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get('model', 'mock'),
+                "choices": [],
+                "usage": self._usage(body, config),
+            })
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+    def _send_event(self, payload):
+        self._send_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8'))
+
+    def _send_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_mock_server(host='127.0.0.1', port=0, config=None):
+    """在后台线程启动模拟服务器，port为0时自动分配端口
+
+    Returns:
+        MockLLMServer: 服务器对象，url属性为接口地址，shutdown()停止
+    """
+    server = MockLLMServer((host, port), config or MockLLMConfig())
+    threading.Thread(target=server.serve_forever, name="mock-llm-server", daemon=True).start()
+    return server
+
+
+def add_config_arguments(parser):
+    parser.add_argument('--latency', type=float, default=0.5, help="首个片段前的延迟（秒）")
+    parser.add_argument('--tail-rate', type=float, default=0.0, help="出现长尾延迟的概率")
+    parser.add_argument('--tail-latency', type=float, default=5.0, help="长尾请求的延迟（秒）")
+    parser.add_argument('--tokens-per-second', type=float, default=100.0, help="生成速度，0表示不限速")
+    parser.add_argument('--chunk-size', type=int, default=4, help="每个流式片段的字符数")
+    parser.add_argument('--no-reasoning', action='store_true', help="不发送reasoning_content")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="注入错误的概率")
+    parser.add_argument('--error-status', type=int, default=500, help="注入错误时的HTTP状态码")
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def config_from_args(args):
+    return MockLLMConfig(
+        latency=args.latency,
+        tail_rate=args.tail_rate,
+        tail_latency=args.tail_latency,
+        tokens_per_second=args.tokens_per_second,
+        chunk_size=args.chunk_size,
+        reasoning='' if args.no_reasoning else DEFAULT_REASONING,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed,
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="本地OpenAI兼容的模拟大模型服务器")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=18080)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    server = MockLLMServer((args.host, args.port), config_from_args(args))
+    print(f"模拟服务器已启动：{server.url}  （设置 OPENAI_BASE_URL={server.url} 使用）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+qt_workers.py
+在 QThreadPool 中执行耗时任务（AI对话、应用题生成、答案检查），通过信号把进度和结果送回界面线程，
+界面线程只做控件更新，不会被网络请求阻塞；任务可按所属窗口或标签取消
+"""
+import threading
+
+from PyQt5.QtCore import QEvent, QObject, QRunnable, QThreadPool, pyqtSignal
+
+# 进度更新的最小间隔（秒），约一帧；期间到达的片段合并为一次更新
+FRAME_INTERVAL = 1 / 60
+
+
+class WorkerSignals(QObject):
+    progress = pyqtSignal(object)
+    result = pyqtSignal(object)
+    error = pyqtSignal(str)
+    finished = pyqtSignal()
+
+
+class Worker(QRunnable):
+    """在线程池中执行 fn(*args, progress=..., cancelled=..., **kwargs)
+
+    fn 通过 progress(value) 发送中间结果，定期调用 cancelled() 检查是否已被取消；
+    取消后不再发送 progress/result/error 信号。
+    """
+
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def _progress(self, value):
+        if not self.is_cancelled():
+            self.signals.progress.emit(value)
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, progress=self._progress, cancelled=self.is_cancelled, **self.kwargs)
+        except Exception as e:
+            if not self.is_cancelled():
+                self.signals.error.emit(str(e))
+        else:
+            if not self.is_cancelled():
+                self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
+class TaskRunner(QObject):
+    """管理界面发起的后台任务
+
+    submit() 提交的任务可以指定所属窗口（窗口关闭时自动取消）和标签（同一标签的新任务会取消旧任务）；
+    回调都在界面线程执行，任务取消后即使信号已在队列中也不会再调用回调。
+    """
+
+    def __init__(self, parent=None, pool=None):
+        super().__init__(parent)
+        self.pool = pool or QThreadPool.globalInstance()
+        # 保留运行中任务的引用，避免信号对象在任务结束前被回收
+        self._active = {}
+
+    def submit(self, fn, *args, on_result=None, on_error=None, on_progress=None,
+               owner=None, tag=None, **kwargs):
+        """提交任务，返回 Worker
+
+        Args:
+            fn (callable): 在工作线程中执行的函数，需接受 progress 和 cancelled 关键字参数
+            on_result/on_error/on_progress (callable, optional): 界面线程中的回调
+            owner (QWidget, optional): 所属窗口，关闭时取消任务
+            tag (str, optional): 任务标签，提交时先取消同标签的未完成任务
+        """
+        if tag is not None:
+            self.cancel(tag=tag)
+        worker = Worker(fn, *args, **kwargs)
+        worker.setAutoDelete(False)
+        self._active[worker] = (owner, tag)
+        signals = worker.signals
+        if on_progress:
+            signals.progress.connect(self._guard(worker, on_progress))
+        if on_result:
+            signals.result.connect(self._guard(worker, on_result))
+        if on_error:
+            signals.error.connect(self._guard(worker, on_error))
+        signals.finished.connect(lambda: self._active.pop(worker, None))
+        if owner is not None:
+            owner.installEventFilter(self)
+        self.pool.start(worker)
+        return worker
+
+    @staticmethod
+    def _guard(worker, callback):
+        # 取消前已排队的信号到达界面线程时直接丢弃
+        def slot(value):
+            if not worker.is_cancelled():
+                callback(value)
+        return slot
+
+    def cancel(self, owner=None, tag=None):
+        """取消属于owner和/或带有tag的任务，两者都为None时取消全部任务"""
+        for worker, (worker_owner, worker_tag) in list(self._active.items()):
+            if owner is not None and worker_owner is not owner:
+                continue
+            if tag is not None and worker_tag != tag:
+                continue
+            worker.cancel()
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Close:
+            self.cancel(owner=obj)
+        return False
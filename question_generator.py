@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+question_generator.py
+按目标难度程序化生成 Un 支持的题型：整数/分数四则运算、带括号的表达式、一元一次方程
+estimate_difficulty 只扫描一遍题目的结构（运算符、括号层数、数的位数、未知数位置）估计难度，
+stream() 是惰性的无限生成器，每次产出时按当前目标难度生成
+"""
+import random
+import re
+from collections import deque
+from fractions import Fraction
+
+import Un
+from question_templates import GeneratedQuestion, MIN_DIFF, MAX_DIFF
+
+_TOKEN_RE = re.compile(r'\d+|[-+*/()x=]')
+# 各运算符、每对括号、每层嵌套、每多一位数字增加的难度
+_OP_WEIGHT = {'+': 50, '-': 70, '*': 120, '/': 180}
+_PAREN_WEIGHT = 100
+_DEPTH_WEIGHT = 80
+_DIGIT_WEIGHT = 40
+# 方程的基础难度，未知数出现在等号两边、系数为负时增加的难度
+_EQUATION_BASE = 1300
+_BOTH_SIDES_WEIGHT = 200
+_NEGATIVE_WEIGHT = 50
+
+# 目标难度达到该值后才会生成方程、带括号的表达式和分数
+EQUATION_MIN_DIFF = 1300
+PAREN_MIN_DIFF = 1400
+FRACTION_MIN_DIFF = 1200
+
+
+def estimate_difficulty(text):
+    """根据题目结构估计难度（800-2000），不计算结果"""
+    tokens = _TOKEN_RE.findall(text)
+    numbers = digits = 0
+    if 'x' in tokens:
+        diff = _EQUATION_BASE
+        sides = set()
+        side = 0
+        prev = None
+        for t in tokens:
+            if t == '=':
+                side = 1
+            elif t == 'x':
+                sides.add(side)
+                if prev == '-':
+                    diff += _NEGATIVE_WEIGHT
+            elif t in '+-':
+                diff += 60
+            elif t.isdigit():
+                numbers += 1
+                digits += len(t)
+            prev = t
+        if len(sides) == 2:
+            diff += _BOTH_SIDES_WEIGHT
+    else:
+        diff = MIN_DIFF
+        depth = max_depth = 0
+        for t in tokens:
+            if t.isdigit():
+                numbers += 1
+                digits += len(t)
+            elif t == '(':
+                depth += 1
+                max_depth = max(max_depth, depth)
+                diff += _PAREN_WEIGHT
+            elif t == ')':
+                depth -= 1
+            elif t in _OP_WEIGHT:
+                diff += _OP_WEIGHT[t]
+        diff += _DEPTH_WEIGHT * max_depth
+    diff += _DIGIT_WEIGHT * (digits - numbers)
+    return max(MIN_DIFF, min(MAX_DIFF, diff))
+
+
+def _number(rand, max_digits):
+    return str(rand.randint(1, 10 ** rand.randint(1, max_digits) - 1))
+
+
+def _expression(rand, target):
+    # 运算符个数随目标难度增加，难度高时加入分数项和括号
+    n_ops = max(1, min(6, round((target - MIN_DIFF) / 200) + rand.randint(-1, 0)))
+    max_digits = 2 if target >= 1000 else 1
+    ops = [rand.choice('+-*/' if target >= 1000 else '+-*') for _ in range(n_ops)]
+    operands = []
+    for k in range(n_ops + 1):
+        if target >= FRACTION_MIN_DIFF and rand.random() < 0.3:
+            q = rand.randint(2, 9)
+            fraction = f"{rand.randint(1, q - 1)}/{q}"
+            # 乘除号后面的分数加括号，如 (1/2) / (1/4)
+            operands.append(f"({fraction})" if k and ops[k - 1] in '*/' else fraction)
+        else:
+            operands.append(_number(rand, max_digits))
+    if target >= PAREN_MIN_DIFF and n_ops >= 2:
+        # 用括号包住一段连续的运算数，难度更高时再在其中嵌套一层
+        depth = 2 if target >= 1800 and n_ops >= 3 else 1
+        lo, hi = 0, len(operands) - 1
+        for _ in range(depth):
+            if hi - lo < 2:
+                break
+            # 不包住当前整段，否则括号没有意义
+            i = rand.randint(lo, hi - 1)
+            j = rand.randint(i + 1, hi - 1 if i == lo else hi)
+            operands[i] = '(' + operands[i]
+            operands[j] = operands[j] + ')'
+            lo, hi = i, j
+    parts = [operands[0]]
+    for op, operand in zip(ops, operands[1:]):
+        parts.append(f" {op} {operand}")
+    expr = ''.join(parts)
+    # 与 Homework 判分使用同一个计算引擎
+    answer = Un.cal(deque(expr))
+    if target < PAREN_MIN_DIFF and answer < 0:
+        raise ValueError("低难度题目不出现负数结果")
+    return f"{expr} = ?", answer
+
+
+def _equation(rand, target):
+    # ax + b = cx + d，保证 a != c；难度高时未知数出现在两边、解可以是分数
+    both_sides = target >= 1500 and rand.random() < 0.7
+    a = rand.choice([-1, 1]) * rand.randint(1, 12) if target >= 1500 else rand.randint(1, 9)
+    c = rand.randint(1, 9) if both_sides else 0
+    if a == c:
+        a += 1
+    solution = Fraction(rand.randint(-10, 20))
+    if target >= 1700 and rand.random() < 0.5:
+        solution = Fraction(rand.randint(1, 19), rand.choice([2, 3, 4, 5]))
+    b = rand.randint(1, 20) * rand.choice([-1, 1])
+    # d = (a - c) * x + b 必须是整数
+    d = (a - c) * solution + b
+    if d.denominator != 1:
+        d = Fraction(round(d))
+        solution = Fraction(int(d) - b, a - c)
+    left = f"{'' if a == 1 else '-' if a == -1 else a}x{b:+d}"
+    right = f"{'' if c == 1 else c}x{int(d):+d}" if both_sides else f"{int(d)}"
+    text = f"{left}={right}"
+    answer = Un.solve_equation(text)
+    if answer != solution:
+        raise ValueError("方程求解结果不一致")
+    return text, answer
+
+
+def generate_one(target_diff=None, tolerance=100, rand=None, max_tries=12):
+    """生成一道题，返回 GeneratedQuestion(question, answer, diff)，取实际难度最接近目标的一次"""
+    rand = rand or random
+    if target_diff is None:
+        target_diff = rand.randint(MIN_DIFF, MAX_DIFF)
+    best = None
+    for _ in range(max_tries):
+        make = _equation if target_diff >= EQUATION_MIN_DIFF and rand.random() < 0.3 else _expression
+        try:
+            text, answer = make(rand, target_diff)
+        except (ValueError, ZeroDivisionError):
+            continue
+        diff = estimate_difficulty(text)
+        if best is None or abs(diff - target_diff) < abs(best.diff - target_diff):
+            best = GeneratedQuestion(text, str(answer), diff)
+        if abs(diff - target_diff) <= tolerance:
+            break
+    if best is None:
+        answer = rand.randint(2, 9)
+        best = GeneratedQuestion(f"{answer - 1} + 1 = ?", str(answer), MIN_DIFF)
+    return best
+
+
+def stream(target, tolerance=100, seed=None):
+    """惰性的无限题目生成器
+
+    Args:
+        target (int | callable): 目标难度，或每次生成前调用以获取当前目标难度的函数
+        tolerance (int): 允许的难度偏差
+        seed (int, optional): 随机种子
+    """
+    rand = random.Random(seed)
+    while True:
+        yield generate_one(target() if callable(target) else target, tolerance, rand)
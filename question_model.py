@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+question_model.py
+难度筛选页的题目列表模型：直接引用 Homework 按难度排序的题库，只记录筛选结果的下标范围，
+按需分页加载（canFetchMore/fetchMore），显示文本在视图请求时才生成；
+筛选范围变化时只插入/删除进出范围的行，不重建整个列表
+"""
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, Qt
+
+# 题目ID所在的数据角色
+QUESTION_ID_ROLE = Qt.UserRole + 1
+
+
+def display_text(q):
+    """列表中显示的题目文本"""
+    return f"{q.id}. 难度: {q.diff} - {q.q.replace('*', '×').replace('/', '÷')}"
+
+
+class QuestionListModel(QAbstractListModel):
+    """Homework 题库中某个难度范围的题目
+
+    Args:
+        homework (Homework): 题库所属的作业对象
+        page_size (int): 每次加载的行数
+    """
+
+    def __init__(self, homework, page_size=100, parent=None):
+        super().__init__(parent)
+        self.homework = homework
+        self.page_size = page_size
+        self._diff_min = None
+        self._diff_max = None
+        self._start = 0
+        self._end = 0
+        self._loaded = 0
+        self._bank_size = 0
+
+    def set_range(self, diff_min=None, diff_max=None):
+        """显示难度在[diff_min, diff_max]内的题目，None表示不限
+
+        新范围与已加载的行有重叠时只增删两端进出范围的行（已加载的行、滚动位置和选中项保持不变），
+        否则（或题库已变化、头部新增超过一页）重置模型。
+        """
+        self._diff_min, self._diff_max = diff_min, diff_max
+        start, end = self.homework.diff_bounds(diff_min, diff_max)
+        loaded_end = self._start + self._loaded
+        if (len(self.homework.q_bank) != self._bank_size or not self._loaded
+                or start >= loaded_end or end <= self._start
+                or self._start - start > self.page_size):
+            self._reset(start, end)
+            return
+        # 尾部：已加载但超出新范围的行
+        if end < loaded_end:
+            self.beginRemoveRows(QModelIndex(), end - self._start, self._loaded - 1)
+            self._loaded = end - self._start
+            self.endRemoveRows()
+        # 头部：离开范围的行删除，进入范围的行插入到最前面
+        if start > self._start:
+            self.beginRemoveRows(QModelIndex(), 0, start - self._start - 1)
+            self._loaded -= start - self._start
+            self._start = start
+            self.endRemoveRows()
+        elif start < self._start:
+            self.beginInsertRows(QModelIndex(), 0, self._start - start - 1)
+            self._loaded += self._start - start
+            self._start = start
+            self.endInsertRows()
+        self._end = end
+        # 已加载的行不足一页时补足
+        if self._loaded < self.page_size:
+            self.fetchMore()
+
+    def _reset(self, start, end):
+        self.beginResetModel()
+        self._start, self._end = start, end
+        self._bank_size = len(self.homework.q_bank)
+        self._loaded = min(self.page_size, end - start)
+        self.endResetModel()
+
+    def refresh(self):
+        """题库有增减（如补充了新题目）时重新定位当前范围"""
+        if len(self.homework.q_bank) != self._bank_size:
+            self._reset(*self.homework.diff_bounds(self._diff_min, self._diff_max))
+
+    def total(self):
+        """筛选结果的总数（包括尚未加载的部分）"""
+        return self._end - self._start
+
+    def question(self, row):
+        return self.homework.q_bank[self._start + row]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._loaded
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._loaded < self.total()
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(self.page_size - self._loaded % self.page_size, self.total() - self._loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < self._loaded:
+            return None
+        if role == Qt.DisplayRole:
+            return display_text(self.question(index.row()))
+        if role == QUESTION_ID_ROLE:
+            return self.question(index.row()).id
+        return None
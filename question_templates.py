@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+question_templates.py
+本地应用题模板引擎：模板在导入时编译一次，按目标难度抽取参数，支持批量快速生成
+不依赖AI，可直接为 Homework 题库补充题目，保证离线可用
+"""
+import math
+import random
+from collections import namedtuple
+from functools import lru_cache
+
+GeneratedQuestion = namedtuple('GeneratedQuestion', ['question', 'answer', 'diff'])
+
+MIN_DIFF = 800
+MAX_DIFF = 2000
+
+# 各运算的基础难度，每多一位数增加的难度，以及需要进位/借位/余数时增加的难度
+_OP_BASE = {'add': 800, 'sub': 850, 'mul': 1000, 'ceil_div': 1100}
+_OP_DIGIT = {'add': 200, 'sub': 200, 'mul': 250, 'ceil_div': 200}
+_CARRY_BONUS = 100
+
+# (模板, 运算, a的最大位数, b的最大位数)
+TEMPLATES = [
+    ("小明有{a}个苹果，又买了{b}个，现在有多少个苹果？", 'add', 3, 3),
+    ("一辆汽车每小时行驶{a}公里，{b}小时后行驶了多少公里？", 'mul', 3, 2),
+    ("妈妈买了{a}个鸡蛋，做菜用了{b}个，还剩多少个？", 'sub', 3, 3),
+    ("一个长方形长{a}厘米，宽{b}厘米，面积是多少平方厘米？", 'mul', 3, 3),
+    ("一瓶水重{a}克，又加了{b}克，现在有多少克？", 'add', 4, 4),
+    ("小红有{a}元钱，买了{b}元的文具，还剩多少钱？", 'sub', 4, 4),
+    ("一辆火车每小时行驶{a}公里，{b}小时后行驶了多少公里？", 'mul', 3, 2),
+    ("一根绳子长{a}米，剪去{b}米，还剩多少米？", 'sub', 3, 3),
+    ("一个班有{a}个男生，{b}个女生，班里共有多少人？", 'add', 2, 2),
+    ("一桶油重{a}千克，倒出{b}千克，还剩多少千克？", 'sub', 3, 3),
+    ("小明买了{a}支铅笔，每支{b}元，一共花了多少钱？", 'mul', 2, 2),
+    ("一本书有{a}页，小明每天看{b}页，几天能看完？", 'ceil_div', 3, 2),
+]
+
+
+def _has_carry(op, a, b):
+    # 个位需要进位、借位，或除法有余数（需要向上取整）
+    if op == 'add':
+        return a % 10 + b % 10 >= 10
+    if op == 'sub':
+        return a % 10 < b % 10
+    if op == 'ceil_div':
+        return a % b != 0
+    return False
+
+
+def estimate_difficulty(op, a, b):
+    """按运算类型、数的位数和是否进位估计题目难度（800-2000）"""
+    diff = _OP_BASE[op] + _OP_DIGIT[op] * (len(str(a)) + len(str(b)) - 2)
+    if _has_carry(op, a, b):
+        diff += _CARRY_BONUS
+    return max(MIN_DIFF, min(MAX_DIFF, diff))
+
+
+def _answer(op, a, b):
+    if op == 'add':
+        return a + b
+    if op == 'sub':
+        return a - b
+    if op == 'mul':
+        return a * b
+    return math.ceil(a / b)
+
+
+class _CompiledTemplate:
+    __slots__ = ('format', 'op', 'max_da', 'max_db')
+
+    def __init__(self, text, op, max_da, max_db):
+        self.format = text.format
+        self.op = op
+        self.max_da = max_da
+        self.max_db = max_db
+
+
+class TemplateEngine:
+    """按目标难度批量生成应用题
+
+    每个(模板, a的位数, b的位数)组合都有确定的基础难度，按目标难度预先筛出可用组合
+    （按难度分桶缓存），再在组合内随机取数，只有实际难度偏离目标时才重新抽取。
+
+    Args:
+        templates (list, optional): (模板, 运算, a的最大位数, b的最大位数) 列表
+        seed (int, optional): 随机种子
+    """
+
+    # 抽取参数的最大重试次数，超过后接受最后一次结果
+    MAX_TRIES = 8
+
+    def __init__(self, templates=None, seed=None):
+        self._templates = [_CompiledTemplate(*t) for t in (templates or TEMPLATES)]
+        self._random = random.Random(seed)
+        # (模板, a的位数, b的位数, 不含进位的难度)
+        self._combos = []
+        for tpl in self._templates:
+            for da in range(1, tpl.max_da + 1):
+                for db in range(1, tpl.max_db + 1):
+                    if tpl.op in ('sub', 'ceil_div') and da < db:
+                        continue  # 被减数/被除数不小于减数/除数
+                    base = estimate_difficulty(tpl.op, 10 ** (da - 1) + 1, 10 ** (db - 1) + 1)
+                    self._combos.append((tpl, da, db, base))
+        self._candidates = lru_cache(maxsize=256)(self._candidates_for)
+
+    def _candidates_for(self, target, tolerance):
+        # 基础难度或加上进位难度后落在目标范围内的组合
+        lo, hi = target - tolerance, target + tolerance
+        found = [c for c in self._combos
+                 if lo <= c[3] <= hi or (c[0].op != 'mul' and lo <= c[3] + _CARRY_BONUS <= hi)]
+        if not found:
+            # 目标超出所有组合的范围时退回到难度最接近的组合
+            best = min(abs(c[3] - target) for c in self._combos)
+            found = [c for c in self._combos if abs(c[3] - target) == best]
+        return tuple(found)
+
+    def generate_one(self, target_diff=None, tolerance=100):
+        """生成一道题，返回 GeneratedQuestion(question, answer, diff)
+
+        Args:
+            target_diff (int, optional): 目标难度，为None时在800-2000内均匀抽取
+            tolerance (int): 允许的难度偏差
+        """
+        rand = self._random
+        if target_diff is None:
+            target_diff = rand.randint(MIN_DIFF, MAX_DIFF)
+        # 目标难度按25分桶，使候选组合的缓存可以复用
+        candidates = self._candidates(int(target_diff) // 25 * 25, tolerance)
+        randint = rand.randint
+        for _ in range(self.MAX_TRIES):
+            tpl, da, db, _ = candidates[rand.randrange(len(candidates))]
+            op = tpl.op
+            a = randint(max(2, 10 ** (da - 1)), 10 ** da - 1)
+            b = randint(max(2, 10 ** (db - 1)), 10 ** db - 1)
+            if op in ('sub', 'ceil_div'):
+                if a < b:
+                    a, b = b, a
+                if a == b:
+                    a += 1
+            diff = estimate_difficulty(op, a, b)
+            if abs(diff - target_diff) <= tolerance:
+                break
+        return GeneratedQuestion(tpl.format(a=a, b=b), str(_answer(op, a, b)), diff)
+
+    def generate(self, n, target_diff=None, tolerance=100):
+        """批量生成n道题，返回 GeneratedQuestion 列表"""
+        generate_one = self.generate_one
+        return [generate_one(target_diff, tolerance) for _ in range(n)]
+
+
+@lru_cache(maxsize=None)
+def default_engine():
+    """进程内共享的模板引擎"""
+    return TemplateEngine()
+
+
+def generate(n, target_diff=None, tolerance=100):
+    """使用共享引擎批量生成n道题"""
+    return default_engine().generate(n, target_diff, tolerance)
@@ -1,104 +1,449 @@
+"""
+run_both.py
+同时运行作业推荐程序（main.py）和 VTuber 服务器（vlu/qd.py）的进程监控器：
+基于 asyncio 子进程，进程退出和输出都由事件驱动处理，不轮询；
+每个进程有自己的重启策略和退避时间，服务器端口可以连接后才启动界面，退出时按启动的相反顺序关闭
+日志经队列由后台线程成批写入 UTF-8 文件（按大小轮转，去掉终端颜色代码），--json-logs 时每行一条JSON
+"""
+import argparse
+import asyncio
+import json
+import logging
+import queue
+import re
+import signal
 import subprocess
-import os
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
-import logging
-
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('run_both.log', encoding='gbk'),
-        logging.StreamHandler()
-    ]
-)
 
 # 获取项目根目录
 project_root = Path(__file__).parent.resolve()
 
-# 定义要运行的脚本路径
-test_script = project_root / 'main.py'
-qd_script = project_root / 'vlu' / 'qd.py'
-
-# 验证脚本存在
-if not test_script.exists():
-    logging.error(f"Test script not found at {test_script}")
-    exit(1)
-
-if not qd_script.exists():
-    logging.error(f"QD script not found at {qd_script}")
-    exit(1)
-
-
-try:
-    test_process = subprocess.Popen(
-        ['python', str(test_script)],
-        cwd=project_root,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        encoding='utf-8'
-    )
-    logging.info(f"Started test.py (PID: {test_process.pid})")
-except Exception as e:
-    logging.error(f"Failed to start test.py: {str(e)}")
-    exit(1)
-
-# 运行qd.py的进程
-try:
-    qd_process = subprocess.Popen(
-        ['uv', 'run', str(qd_script)],
-        cwd=project_root / 'vlu',
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        encoding='utf-8'
-    )
-    logging.info(f"Started qd.py (PID: {qd_process.pid})")
-except Exception as e:
-    logging.error(f"Failed to start qd.py: {str(e)}")
-    test_process.terminate()
-    exit(1)
-
-# 输出处理线程函数
-def output_reader(pipe, prefix):
-    try:
-        for line in iter(pipe.readline, ''):
-            logging.info(f'[{prefix}] {line.strip()}')
-    except ValueError:
-        pass  # 管道关闭时的正常异常
-
-# 创建并启动输出线程
-from threading import Thread
-
-test_thread = Thread(target=output_reader, args=(test_process.stdout, 'test.py'))
-qd_thread = Thread(target=output_reader, args=(qd_process.stdout, 'qd.py'))
-test_thread.daemon = True
-qd_thread.daemon = True
-test_thread.start()
-qd_thread.start()
-
-# 进程监控循环
-try:
+# VTuber 服务器监听的端口，可以连接时认为服务器已就绪
+VTUBER_PORT = 12393
+# 打包后 sys.executable 是本程序自身，只能使用系统中的 python
+PYTHON = 'python' if getattr(sys, 'frozen', False) else sys.executable
+
+# 重启策略：always 总是重启；on-failure 返回码非0（或启动失败）时重启；never 不重启
+RESTART_POLICIES = ('always', 'on-failure', 'never')
+# 子进程输出每次读取的字节数，以及单条日志的最大字节数（更长的行分成多条记录）
+READ_SIZE = 64 * 1024
+MAX_LINE_BYTES = 64 * 1024
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+# 终端颜色等控制序列（如 loguru 的彩色输出），写入文件前去掉
+_ANSI_RE = re.compile(r'\x1b\[[0-?]*[ -/]*[@-~]')
+
+
+def strip_ansi(text):
+    return _ANSI_RE.sub('', text)
+
+
+class TextFormatter(logging.Formatter):
+    """文本日志：子进程的输出加上 [进程名] 前缀，strip 为 True 时去掉控制序列"""
+
+    def __init__(self, fmt=LOG_FORMAT, strip=True):
+        super().__init__(fmt)
+        self.strip = strip
+        self._second = None
+        self._second_text = ''
+
+    def formatTime(self, record, datefmt=None):
+        # 同一秒内的记录复用格式化好的日期时间
+        second = int(record.created)
+        if second != self._second:
+            self._second = second
+            self._second_text = time.strftime(self.default_time_format, self.converter(record.created))
+        return self.default_msec_format % (self._second_text, record.msecs)
+
+    def formatMessage(self, record):
+        child = getattr(record, 'child', None)
+        if child:
+            record.message = f"[{child}] {record.message}"
+        text = super().formatMessage(record)
+        return strip_ansi(text) if self.strip else text
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """每条记录一行JSON，source 为输出该行的子进程（监控器自身为 run_both）"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'source': getattr(record, 'child', None) or 'run_both',
+            'message': strip_ansi(record.getMessage()),
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class BatchedRotatingFileHandler(RotatingFileHandler):
+    """UTF-8、按大小轮转的日志文件
+
+    记录先写入文件缓冲区，积累 batch_size 条或日志队列空闲时才写入磁盘，
+    不像 FileHandler 那样每条记录都 flush 一次。
+    """
+
+    def __init__(self, filename, max_bytes=5 * 1024 * 1024, backup_count=3, batch_size=200):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self.batch_size = batch_size
+        self._pending = 0
+        self._size = self._end_of_stream()
+
+    def _end_of_stream(self):
+        self.stream.seek(0, 2)
+        return self.stream.tell()
+
+    def emit(self, record):
+        # 标准实现每条记录都会检查文件类型、查询文件位置并格式化两次，这里自己记录文件大小，只格式化一次
+        try:
+            msg = self.format(record) + self.terminator
+            # maxBytes 和文件位置都按字节计，中文在 UTF-8 中占3个字节，不能按字符数累计
+            size = len(msg.encode(self.encoding))
+            if self.stream is None:
+                self.stream = self._open()
+                self._size = self._end_of_stream()
+            if self.maxBytes > 0 and self._size + size >= self.maxBytes:
+                self.doRollover()
+                self._size = 0
+            self.stream.write(msg)
+            self._size += size
+            self._pending += 1
+            if self._pending >= self.batch_size:
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self._pending = 0
+        super().flush()
+
+
+class BatchingQueueListener(QueueListener):
+    """队列中暂时没有记录时先让各处理器写入积累的记录，再阻塞等待"""
+
+    def dequeue(self, block):
+        try:
+            return self.queue.get_nowait()
+        except queue.Empty:
+            pass
+        for handler in self.handlers:
+            handler.flush()
+        return self.queue.get(block)
+
+
+def setup_logging(log_file='run_both.log', json_lines=False, max_bytes=5 * 1024 * 1024, backup_count=3):
+    """把日志记录放入队列，由后台线程写入文件和控制台，返回已启动的 QueueListener
+
+    读取子进程输出的协程只做入队，不会因为写文件或控制台而阻塞，子进程也就不会卡在输出管道上。
+    """
+    file_handler = BatchedRotatingFileHandler(log_file, max_bytes, backup_count)
+    file_handler.setFormatter(JsonLinesFormatter() if json_lines else TextFormatter())
+    handlers = [file_handler]
+    # 打包成无控制台程序时没有 stderr
+    if sys.stderr is not None:
+        if hasattr(sys.stderr, 'reconfigure'):
+            # GBK 控制台无法显示的字符替换掉，不再抛出编码错误
+            sys.stderr.reconfigure(errors='replace')
+        console = logging.StreamHandler()
+        console.setFormatter(TextFormatter(strip=False))
+        handlers.append(console)
+
+    # 日志格式用不到的调用位置、线程和进程信息不再收集，减少每条记录的开销
+    logging._srcfile = None
+    logging.logThreads = logging.logProcesses = logging.logMultiprocessing = False
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(QueueHandler(log_queue))
+    listener = BatchingQueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+class ManagedProcess:
+    """受监控的子进程配置
+
+    Args:
+        name (str): 日志中显示的名称
+        args (list): 命令行
+        cwd (Path): 工作目录
+        restart (str): 重启策略，见 RESTART_POLICIES
+        essential (bool): 该进程结束（且不再重启）时关闭所有进程
+        ready_port (int, optional): 端口可以连接时认为进程已就绪，后面的进程等它就绪后才启动
+        ready_timeout (float): 等待就绪的最长时间（秒），超时后照常启动后面的进程
+        max_restarts (int): 连续重启的最大次数
+        backoff (float): 第一次重启前等待的秒数，之后每次翻倍
+        max_backoff (float): 重启前等待的最长时间
+        stable_after (float): 运行超过该秒数后退出，重新开始计算连续重启次数
+    """
+
+    def __init__(self, name, args, cwd, restart='on-failure', essential=False, ready_port=None,
+                 ready_timeout=60.0, max_restarts=5, backoff=1.0, max_backoff=30.0, stable_after=30.0):
+        if restart not in RESTART_POLICIES:
+            raise ValueError(f"未知的重启策略：{restart}")
+        self.name = name
+        self.args = [str(a) for a in args]
+        self.cwd = cwd
+        self.restart = restart
+        self.essential = essential
+        self.ready_port = ready_port
+        self.ready_timeout = ready_timeout
+        self.max_restarts = max_restarts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.process = None
+        self.ready = None
+        self.exited = None
+
+    def should_restart(self, returncode):
+        # returncode 为 None 表示进程没能启动
+        if self.restart == 'always':
+            return True
+        return self.restart == 'on-failure' and returncode != 0
+
+    def restart_delay(self, failures):
+        return min(self.max_backoff, self.backoff * 2 ** (failures - 1))
+
+
+async def wait_for_port(port, host='127.0.0.1', interval=0.25):
+    """等待端口可以建立连接"""
     while True:
-        if test_process.poll() is not None and qd_process.poll() is not None:
-            break
-        
-        # 降低CPU占用
-        test_thread.join(0.1)
-        qd_thread.join(0.1)
-
-except KeyboardInterrupt:
-    logging.warning("收到中断信号，终止进程...")
-
-finally:
-    # 确保进程终止
-    for p in [test_process, qd_process]:
-        if p.poll() is None:
-            p.terminate()
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            await asyncio.sleep(interval)
+        else:
+            writer.close()
+            return
+
+
+class Supervisor:
+    """按顺序启动进程并监控，进程退出时按重启策略处理
+
+    Args:
+        processes (list): ManagedProcess 列表，按启动顺序排列，关闭时按相反顺序
+        shutdown_timeout (float): 关闭时等待每个进程正常退出的秒数，超时后强制结束
+    """
+
+    def __init__(self, processes, shutdown_timeout=5.0):
+        self.processes = processes
+        self.shutdown_timeout = shutdown_timeout
+        self._stop = None
+
+    def stop(self):
+        if self._stop is not None and not self._stop.is_set():
+            logging.info("正在关闭所有进程...")
+            self._stop.set()
+
+    async def run(self):
+        self._stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows 不支持，Ctrl+C 由 asyncio.run 取消任务
+        tasks = []
+        try:
+            for mp in self.processes:
+                if self._stop.is_set():
+                    break
+                mp.ready = asyncio.Event()
+                mp.exited = asyncio.Event()
+                task = asyncio.create_task(self._supervise(mp))
+                tasks.append(task)
+                if mp.ready_port is not None:
+                    await self._wait_ready(mp, task)
+            await self._stop.wait()
+        finally:
+            await self._shutdown()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        logging.info("所有进程已终止")
+
+    async def _wait_ready(self, mp, task):
+        # 等到进程就绪、超时、启动失败或退出、放弃重启或收到关闭请求中最先发生的一个；
+        # 进程没能就绪时由 _supervise 在后台继续重启，不让后面的进程等完整个重启过程
+        ready = asyncio.create_task(mp.ready.wait())
+        exited = asyncio.create_task(mp.exited.wait())
+        stop = asyncio.create_task(self._stop.wait())
+        done, _ = await asyncio.wait({ready, exited, stop, task}, timeout=mp.ready_timeout,
+                                     return_when=asyncio.FIRST_COMPLETED)
+        ready.cancel()
+        exited.cancel()
+        stop.cancel()
+        if not done:
+            logging.warning(f"{mp.name} 在 {mp.ready_timeout:.0f} 秒内没有就绪，继续启动其他进程")
+        elif exited in done and ready not in done:
+            logging.warning(f"{mp.name} 没有就绪就退出了，继续启动其他进程")
+
+    async def _supervise(self, mp):
+        loop = asyncio.get_running_loop()
+        failures = 0
+        while not self._stop.is_set():
+            started = loop.time()
+            returncode = await self._run_once(mp)
+            if self._stop.is_set():
+                return
+            if not mp.should_restart(returncode):
+                if mp.essential:
+                    self.stop()
+                return
+            if loop.time() - started >= mp.stable_after:
+                failures = 0
+            failures += 1
+            if failures > mp.max_restarts:
+                logging.error(f"{mp.name} 连续重启 {mp.max_restarts} 次仍然退出，不再重启")
+                if mp.essential:
+                    self.stop()
+                return
+            delay = mp.restart_delay(failures)
+            logging.warning(f"{delay:.1f} 秒后重启 {mp.name}（第 {failures} 次）")
+            try:
+                await asyncio.wait_for(self._stop.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_once(self, mp):
+        """启动一次进程并等待它退出，返回返回码，启动失败时返回None"""
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *mp.args, cwd=mp.cwd,
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            )
+        except OSError as e:
+            logging.error(f"Failed to start {mp.name}: {e}")
+            mp.exited.set()
+            return None
+        mp.process = proc
+        logging.info(f"Started {mp.name} (PID: {proc.pid})")
+        output = asyncio.create_task(self._read_output(mp, proc.stdout))
+        ready = asyncio.create_task(self._check_ready(mp)) if mp.ready_port is not None else None
+        try:
+            returncode = await proc.wait()
+        finally:
+            if ready is not None:
+                ready.cancel()
+            mp.ready.clear()
+            mp.exited.set()
+            mp.process = None
+            # 子进程可能把输出管道留给了自己的子进程，最多再读1秒剩余的输出
+            try:
+                await asyncio.wait_for(output, 1.0)
+            except asyncio.TimeoutError:
+                pass
+            except Exception as e:
+                logging.error(f"读取 {mp.name} 的输出失败: {e!r}")
+        level = logging.INFO if returncode == 0 or self._stop.is_set() else logging.WARNING
+        logging.log(level, f"{mp.name} 已退出（返回码 {returncode}）")
+        return returncode
+
+    async def _read_output(self, mp, stream):
+        # 不用 StreamReader.readline：超过64KiB的行会抛出 ValueError 使读取结束，子进程随后卡在写满的管道上
+        buffer = b''
+        while True:
+            data = await stream.read(READ_SIZE)
+            if not data:
+                break
+            buffer += data
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                self._log_output(mp, line)
+            while len(buffer) >= MAX_LINE_BYTES:
+                self._log_output(mp, buffer[:MAX_LINE_BYTES])
+                buffer = buffer[MAX_LINE_BYTES:]
+        if buffer:
+            self._log_output(mp, buffer)
+
+    @staticmethod
+    def _log_output(mp, line):
+        logging.info('%s', line.decode('utf-8', errors='replace').rstrip(), extra={'child': mp.name})
+
+    async def _check_ready(self, mp):
+        start = asyncio.get_running_loop().time()
+        await wait_for_port(mp.ready_port)
+        mp.ready.set()
+        elapsed = asyncio.get_running_loop().time() - start
+        logging.info(f"{mp.name} 已就绪：端口 {mp.ready_port} 可以连接（{elapsed:.1f} 秒）")
+
+    async def _shutdown(self):
+        # 按启动的相反顺序关闭：先关界面，再关服务器
+        for mp in reversed(self.processes):
+            proc = mp.process
+            if proc is None or proc.returncode is not None:
+                continue
+            logging.info(f"正在关闭 {mp.name} (PID: {proc.pid})")
             try:
-                p.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                p.kill()
-    
-    logging.info("所有进程已终止")
\ No newline at end of file
+                proc.terminate()
+                await asyncio.wait_for(proc.wait(), self.shutdown_timeout)
+            except ProcessLookupError:
+                pass
+            except asyncio.TimeoutError:
+                logging.warning(f"{mp.name} 在 {self.shutdown_timeout:.0f} 秒内没有退出，强制结束")
+                proc.kill()
+                await proc.wait()
+
+
+def default_processes():
+    """VTuber 服务器（可选）和作业推荐程序"""
+    # 定义要运行的脚本路径
+    test_script = project_root / 'main.py'
+    qd_script = project_root / 'vlu' / 'qd.py'
+
+    # 验证脚本存在
+    if not test_script.exists():
+        logging.error(f"Test script not found at {test_script}")
+        sys.exit(1)
+
+    processes = []
+    if qd_script.exists():
+        # 服务器意外退出时总是重启；界面等服务器端口可以连接后再启动
+        processes.append(ManagedProcess(
+            'qd.py', ['uv', 'run', qd_script], cwd=project_root / 'vlu',
+            restart='always', ready_port=VTUBER_PORT,
+        ))
+    else:
+        logging.warning(f"QD script not found at {qd_script}，只启动作业推荐程序")
+    # 界面正常关闭时结束所有进程，崩溃时重启
+    processes.append(ManagedProcess(
+        'main.py', [PYTHON, test_script], cwd=project_root,
+        restart='on-failure', essential=True, max_restarts=3,
+    ))
+    return processes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="同时运行作业推荐程序和 VTuber 服务器")
+    parser.add_argument('--log-file', default=None, help="日志文件，默认 run_both.log（JSON 模式为 run_both.jsonl）")
+    parser.add_argument('--json-logs', action='store_true', help="日志文件每行一条JSON记录，便于之后处理")
+    parser.add_argument('--log-max-mb', type=float, default=5, help="日志文件超过该大小（MB）时轮转")
+    parser.add_argument('--log-backups', type=int, default=3, help="保留的旧日志文件数")
+    args = parser.parse_args(argv)
+
+    log_file = args.log_file or ('run_both.jsonl' if args.json_logs else 'run_both.log')
+    listener = setup_logging(log_file, args.json_logs, int(args.log_max_mb * 1024 * 1024), args.log_backups)
+    try:
+        supervisor = Supervisor(default_processes())
+        asyncio.run(supervisor.run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # 写入队列中剩余的记录
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+startup_profile.py
+启动性能分析：各模块的导入耗时、主窗口各部分和二级窗口的创建耗时，
+以及从 main.py 开始执行到第一道题目显示出来的时间（首题可见时间）
+
+用法：python main.py --profile-startup                 # 启动时打印本次的分析报告
+      python startup_profile.py --runs 5                 # 多次冷启动取中位数，超出绝对预算或比基线慢超过容差时返回1
+      python startup_profile.py --runs 5 --update-baseline  # 记录本机的基线（可选，没有基线时只检查绝对预算）
+"""
+import builtins
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# 首题可见的标记名
+FIRST_QUESTION = 'first_question_visible'
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_baseline.json')
+# 首题可见时间的绝对预算（毫秒，含解释器启动），不依赖本机基线，总是检查
+DEFAULT_BUDGET_MS = 1000.0
+
+
+class StartupProfiler:
+    """记录启动过程中的导入、创建耗时和时间点
+
+    时间点（mark）始终记录，开销可以忽略；导入计时和 span 只在 enable() 之后生效。
+    所有时间都相对于本模块被导入的时刻（main.py 的第一条语句）。
+    """
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.enabled = False
+        self.output = None
+        self.imports = {}        # 模块名 -> [累计耗时, 自身耗时]
+        self.spans = []          # (层级, 名称, 耗时)
+        self.marks = {}          # 名称 -> 相对t0的时间
+        self._callbacks = {}
+        self._depth = 0
+        self._import_stack = []
+        self._original_import = None
+
+    def enable(self, output='text'):
+        """开始记录导入和创建耗时，output 为 'text'（可读报告）或 'json'（单行JSON）"""
+        if self.enabled:
+            return
+        self.enabled = True
+        self.output = output
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def disable(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+        self.enabled = False
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # 只为第一次导入计时，已加载的模块直接返回
+        if level or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+        stack = self._import_stack
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            self.imports[name] = [elapsed, elapsed - children]
+
+    @contextmanager
+    def span(self, name):
+        """记录一段创建过程的耗时，可以嵌套"""
+        if not self.enabled:
+            yield
+            return
+        index = len(self.spans)
+        self.spans.append((self._depth, name, 0.0))
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            elapsed = time.perf_counter() - start
+            self.spans[index] = (self._depth, name, elapsed)
+            # 报告打印之后才创建的部分（如第一次打开的二级窗口）单独输出
+            if FIRST_QUESTION in self.marks and self.output == 'text' and self._depth == 0:
+                print(f"[启动分析] {elapsed * 1000:.1f} ms  {name}", flush=True)
+
+    def mark(self, name):
+        """记录时间点（只记录第一次），并调用等待该时间点的回调"""
+        if name in self.marks:
+            return
+        self.marks[name] = time.perf_counter() - self.t0
+        if name == FIRST_QUESTION and self.enabled:
+            self.report()
+        for callback in self._callbacks.pop(name, []):
+            callback()
+
+    def on_mark(self, name, callback):
+        self._callbacks.setdefault(name, []).append(callback)
+
+    def watch_first_paint(self, widget, name=FIRST_QUESTION):
+        """控件第一次绘制时记录时间点"""
+        from PyQt5.QtCore import QEvent, QObject
+
+        profiler = self
+
+        class _FirstPaint(QObject):
+            def eventFilter(self, obj, event):
+                if event.type() == QEvent.Paint:
+                    obj.removeEventFilter(self)
+                    profiler.mark(name)
+                return False
+
+        widget.installEventFilter(_FirstPaint(widget))
+
+    def summary(self, top=15):
+        imports = sorted(self.imports.items(), key=lambda item: -item[1][1])
+        return {
+            'marks_ms': {k: v * 1000 for k, v in self.marks.items()},
+            'import_total_ms': sum(self_time for _, self_time in self.imports.values()) * 1000,
+            'imports_ms': [(name, total * 1000, self_time * 1000) for name, (total, self_time) in imports[:top]],
+            'spans_ms': [(depth, name, elapsed * 1000) for depth, name, elapsed in self.spans],
+        }
+
+    def report(self, file=None):
+        file = file or sys.stdout
+        summary = self.summary()
+        if self.output == 'json':
+            import json
+            print(json.dumps(summary, ensure_ascii=False), file=file, flush=True)
+            return
+        first = summary['marks_ms'].get(FIRST_QUESTION)
+        print(f"[启动分析] 首题可见：{first:.1f} ms（从 main.py 开始执行计）" if first is not None
+              else "[启动分析]", file=file)
+        print(f"  导入合计 {summary['import_total_ms']:.1f} ms，自身耗时最多的模块（累计 / 自身）：", file=file)
+        for name, total, self_time in summary['imports_ms']:
+            print(f"    {total:7.1f} ms {self_time:7.1f} ms  {name}", file=file)
+        print("  创建：", file=file)
+        for depth, name, elapsed in summary['spans_ms']:
+            print(f"    {'  ' * depth}{elapsed:7.1f} ms  {name}", file=file)
+        file.flush()
+
+
+# 进程内共享的分析器
+profiler = StartupProfiler()
+
+
+def measure_cold_start(runs=5, platform=None, timeout=60):
+    """运行 runs 次冷启动，返回每次的首题可见时间（毫秒，从启动子进程计）和进程内的分析结果"""
+    import json
+    import subprocess
+    main = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    env = dict(os.environ)
+    if platform:
+        env['QT_QPA_PLATFORM'] = platform
+    results = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, main, '--profile-startup=json', '--exit-after-first-question'],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env,
+                                encoding='utf-8')
+        summary = None
+        try:
+            for line in proc.stdout:
+                if line.startswith('{'):
+                    wall = (time.perf_counter() - start) * 1000
+                    summary = json.loads(line)
+                    break
+            proc.wait(timeout=timeout)
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+        if summary is None:
+            raise RuntimeError("启动失败：没有收到首题可见的分析结果")
+        results.append((wall, summary))
+    return results
+
+
+def main():
+    # 回归检查用到的模块不在 main.py 启动时导入
+    import argparse
+    import json
+    import statistics
+    parser = argparse.ArgumentParser(description="首题可见时间的回归检查")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="基线文件（JSON）")
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS, help="首题可见时间的绝对上限（毫秒），0表示不检查")
+    parser.add_argument('--require-baseline', action='store_true', help="没有基线文件时返回1")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="允许比基线慢的比例")
+    parser.add_argument('--slack-ms', type=float, default=10.0, help="允许的绝对误差（毫秒）")
+    parser.add_argument('--update-baseline', action='store_true', help="把本次结果写为新的基线")
+    parser.add_argument('--platform', default=None, help="Qt平台插件，如无显示器时用 offscreen")
+    args = parser.parse_args()
+
+    results = measure_cold_start(args.runs, args.platform)
+    wall = statistics.median(w for w, _ in results)
+    in_process = statistics.median(s['marks_ms'][FIRST_QUESTION] for _, s in results)
+    imports = statistics.median(s['import_total_ms'] for _, s in results)
+    print(f"首题可见（中位数，{args.runs}次）：{wall:.1f} ms（含解释器启动），"
+          f"main.py 内 {in_process:.1f} ms，其中导入 {imports:.1f} ms")
+
+    status = 0
+    if args.budget_ms > 0:
+        print(f"绝对预算 {args.budget_ms:.0f} ms")
+        if wall > args.budget_ms:
+            print("首题可见时间超出绝对预算")
+            status = 1
+
+    current = {'first_question_ms': wall, 'in_process_ms': in_process, 'import_ms': imports}
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+        print(f"已更新基线：{args.baseline}")
+        return status
+    try:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        if args.require_baseline:
+            print("没有基线文件，使用 --update-baseline 创建")
+            return 1
+        print("没有基线文件，只检查绝对预算；使用 --update-baseline 创建本机基线")
+        return status
+    limit = baseline['first_question_ms'] * (1 + args.tolerance) + args.slack_ms
+    print(f"基线 {baseline['first_question_ms']:.1f} ms，上限 {limit:.1f} ms")
+    if wall > limit:
+        print("首题可见时间变慢，超出容差")
+        status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
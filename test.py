@@ -1,23 +1,114 @@
 # -*- coding: utf-8 -*-
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-                             QPushButton, QFrame, QMessageBox, QListWidget, QLabel)
+                             QFrame, QMessageBox, QListView, QLabel, QLineEdit, QTextEdit, QSizePolicy)
+from PyQt5.QtGui import QTextCursor
 from PyQt5.QtCore import Qt, QTimer
 import time
 from homework_logic import Homework, Question
-from ui_components import UIComponents, ThemeManager
+from ui_components import UIComponents, ThemeManager, set_style_property
+from chat_history import ChatHistory, truncate_summarizer
+from qt_workers import TaskRunner, FRAME_INTERVAL
+from question_model import QuestionListModel, QUESTION_ID_ROLE
+from window_manager import WindowManager
+from startup_profile import profiler, FIRST_QUESTION
+# AI相关模块（API、latex_readable、ai_application_question）在第一次使用时才导入，不影响启动速度
+
+
+def _format_paragraphs(text):
+    # 先将####转为换行，再按段落分隔，保持可读性
+    text = text.replace('####', '\n')
+    return '\n\n'.join([p.strip() for p in text.split('\n') if p.strip()])
+
+
+def _chat_task(user_input, history, progress, cancelled):
+    """工作线程中的流式对话：按帧合并已转换的片段发送给界面，返回完整的推理和回复内容"""
+    from API import stream_chat_with_ai, get_config_error
+    from latex_readable import LatexStreamConverter
+    error = get_config_error()
+    if error is not None:
+        return {'unavailable': error.message}
+    parts = {'reasoning': [], 'content': []}
+    pending = {'reasoning': [], 'content': []}
+    converters = {'reasoning': LatexStreamConverter(), 'content': LatexStreamConverter()}
+    last = time.monotonic()
+
+    def flush():
+        update = {kind: ''.join(texts) for kind, texts in pending.items() if texts}
+        if update:
+            progress(update)
+        for texts in pending.values():
+            texts.clear()
+
+    stream = stream_chat_with_ai(user_input, history=history, timeout=30, cancelled=cancelled)
+    try:
+        for kind, text in stream:
+            if cancelled():
+                break
+            parts[kind].append(text)
+            readable = converters[kind].feed(text)
+            if readable:
+                pending[kind].append(readable)
+            now = time.monotonic()
+            if now - last >= FRAME_INTERVAL:
+                flush()
+                last = now
+    finally:
+        stream.close()
+    if cancelled():
+        return None
+    for kind, converter in converters.items():
+        tail = converter.flush()
+        if tail:
+            pending[kind].append(tail)
+    flush()
+    if not parts['reasoning'] and not parts['content']:
+        raise Exception("未能获取到有效的AI回复内容")
+    return {'reasoning': ''.join(parts['reasoning']), 'content': ''.join(parts['content'])}
+
+
+def _fetch_question_task(pool, progress, cancelled):
+    # 池为空时最多等待1秒，随后回退到模板题
+    return pool.get()
+
+
+def _check_answer_task(user_answer, standard_answer, progress, cancelled):
+    from ai_application_question import answers_match
+    return answers_match(user_answer, standard_answer)
+
 
 class App(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.hw = Homework()
+        with profiler.span('Homework()'):
+            self.hw = Homework()
         self.current_theme = '蓝色主题'
         self.ui = UIComponents()
-        self.chat_history = []
+        # AI问答的对话历史，按token预算滑动窗口，淘汰的提问汇总为摘要
+        self.chat_history = ChatHistory(token_budget=3000, summarizer=truncate_summarizer)
         self.filter_window = None
+        self.question_model = None
         self.theme_window = None
-        self.add_question_window = None
-        self.ai_chat_window = None
-        self.setup_ui()
+        self.add_window = None
+        self.chat_window = None
+        self.ai_app_window = None
+        self.ai_question_pool = None
+        # AI对话、应用题生成和答案检查都在线程池中执行，界面线程只负责更新控件
+        self.tasks = TaskRunner(self)
+        # 二级窗口第一次打开时创建，关闭后隐藏，再次打开时复用
+        self.windows = WindowManager(self)
+        self.windows.register('filter', self._build_filter_page, self._reset_filter_page)
+        self.windows.register('add_question', self._build_add_question_page, self._reset_add_question_page)
+        self.windows.register('theme', self._build_theme_page)
+        self.windows.register('ai_chat', self._build_ai_chat_page, self._reset_ai_chat_page)
+        self.windows.register('ai_application_question', self._build_ai_application_question_page,
+                              self._reset_ai_application_question_page)
+        with profiler.span('setup_ui()'):
+            self.setup_ui()
+        # 题目第一次绘制出来的时间即首题可见时间
+        profiler.watch_first_paint(self.q_label)
+        # 首题显示后立即开始预生成AI应用题，打开应用题页面时池中已有题目；
+        # 回调在绘制事件中调用，推迟到事件循环空闲时再创建，不拖慢首题显示
+        profiler.on_mark(FIRST_QUESTION, lambda: QTimer.singleShot(0, self.get_ai_question_pool))
         
         # 主窗口关闭时清理所有资源
         self.setAttribute(Qt.WA_DeleteOnClose)
@@ -25,18 +116,12 @@ class App(QMainWindow):
         
     def cleanup_resources(self):
         # 清理所有窗口资源
-        if self.filter_window:
-            self.filter_window.close()
-            self.filter_window.deleteLater()
-        if self.theme_window:
-            self.theme_window.close()
-            self.theme_window.deleteLater()
-        if self.add_question_window:
-            self.add_question_window.close()
-            self.add_question_window.deleteLater()
-        if self.ai_chat_window:
-            self.ai_chat_window.close()
-            self.ai_chat_window.deleteLater()
+        self.windows.release_all()
+        self.question_model = None
+        
+        self.tasks.cancel()
+        if self.ai_question_pool:
+            self.ai_question_pool.stop()
         
         # 清理其他资源
         self.chat_history.clear()
@@ -56,21 +141,13 @@ class App(QMainWindow):
         main_layout.setContentsMargins(30, 30, 30, 30)  # 减小外边距
         main_layout.setSpacing(25)  # 增加组件间距
         
-        # 设置背景
-        ThemeManager.create_gradient_background(self, self.current_theme)
+        # 主题样式表和背景渐变作用于整个程序，之后打开的窗口自动使用当前主题
+        with profiler.span('ThemeManager.apply'):
+            ThemeManager.apply(self.current_theme)
         
         # 创建内容框架
         content_frame = QFrame()
-        content_frame.setStyleSheet(f"""
-            QFrame {{
-                background-color: rgba(255, 255, 255, 0.75);
-                border-radius: 15px;
-                padding: 20px;
-                backdrop-filter: blur(15px);
-                border: 1px solid rgba(255, 255, 255, 0.3);
-                box-shadow: 0 8px 32px 0 rgba(31, 38, 135, 0.37);
-            }}
-        """)
+        content_frame.setProperty('role', 'content')
         main_layout.addWidget(content_frame, stretch=1)
         
         # 设置内容布局
@@ -79,8 +156,9 @@ class App(QMainWindow):
         content_layout.setSpacing(25)  # 增加组件间距
         
         # 添加组件
-        self.setup_rating_label(content_layout)
-        self.setup_question_label(content_layout)
+        with profiler.span('学力和题目标签'):
+            self.setup_rating_label(content_layout)
+            self.setup_question_label(content_layout)
         
         # 创建水平布局容器来居中输入框
         entry_container = QWidget()
@@ -96,7 +174,8 @@ class App(QMainWindow):
         entry_layout.addStretch(1)
         content_layout.addWidget(entry_container)
         
-        self.setup_buttons(content_layout)
+        with profiler.span('按钮'):
+            self.setup_buttons(content_layout)
         
         self.start_quiz()
 
@@ -105,7 +184,6 @@ class App(QMainWindow):
             self,
             f"学力：{self.hw.student['rating']:.2f}",
             18,
-            ThemeManager.get_theme_color(self.current_theme),
             anchor="nw"
         )
         layout.addWidget(self.rating_label)
@@ -121,7 +199,6 @@ class App(QMainWindow):
             self,
             question_text,
             24,  # 将字体大小从16px调整为24px
-            ThemeManager.get_theme_color(self.current_theme)
         )
         layout.addWidget(self.q_label)
 
@@ -135,15 +212,7 @@ class App(QMainWindow):
 
     def setup_buttons(self, layout):
         button_frame = QFrame()
-        button_frame.setStyleSheet(f"""
-            QFrame {{
-                background-color: {ThemeManager.get_theme_color(self.current_theme)};
-                border-radius: 10px;
-                padding: 15px;
-                backdrop-filter: blur(10px);
-                border: 1px solid rgba(255, 255, 255, 0.2);
-            }}
-        """)
+        button_frame.setProperty('role', 'toolbar')
         button_layout = QHBoxLayout(button_frame)
         button_layout.setSpacing(15)  # 设置按钮间距
         
@@ -157,29 +226,7 @@ class App(QMainWindow):
         ]
         
         for text, command in buttons:
-            btn = QPushButton(text)
-            btn.setStyleSheet("""
-                QPushButton {
-                    background-color: rgba(74, 144, 226, 0.85);
-                    color: white;
-                    border: 1px solid rgba(255, 255, 255, 0.2);
-                    padding: 12px 24px;
-                    border-radius: 8px;
-                    font-family: 'Microsoft YaHei';
-                    font-size: 14px;
-                    min-width: 100px;
-                    backdrop-filter: blur(5px);
-                }
-                QPushButton:hover {
-                    background-color: rgba(53, 122, 189, 0.9);
-                    border: 1px solid rgba(255, 255, 255, 0.3);
-                }
-                QPushButton:pressed {
-                    background-color: rgba(42, 95, 158, 0.95);
-                    border: 1px solid rgba(255, 255, 255, 0.4);
-                }
-            """)
-            btn.clicked.connect(command)
+            btn = self.ui.create_button(text, command)
             button_layout.addWidget(btn)
         
         layout.addWidget(button_frame)
@@ -211,41 +258,35 @@ class App(QMainWindow):
         self.rating_label.setText(f"学力：{self.hw.student['rating']:.2f}")
         self.q_label.setText(self.hw.cur_q.q.replace('*', '×').replace('/', '÷') if self.hw.cur_q else "没有更多题目！")
         self.entry.clear()
+        # 题库补充了新题目时更新打开着的筛选列表
+        if self.question_model is not None:
+            self.question_model.refresh()
         
-    def cleanup_filter_window(self, event):
-        # 清理筛选窗口资源
-        if self.filter_window:
-            self.filter_window = None
-        event.accept()
-
     def start_quiz(self):
         self.start_time = time.time()
 
     def open_filter_page(self):
-        # 如果窗口已存在，先清理旧窗口
-        if self.filter_window:
-            self.filter_window.close()
-            self.filter_window.deleteLater()
-            
+        self.windows.open('filter')
+
+    def _build_filter_page(self):
         # 创建新窗口
         self.filter_window = QMainWindow(self)
         self.filter_window.setWindowTitle("题目难度筛选")
         self.filter_window.resize(800, 900)  # 设置初始大小但允许调整
-        self.filter_window.setAttribute(Qt.WA_DeleteOnClose)
-        
-        # 窗口关闭时清理资源
-        self.filter_window.closeEvent = lambda event: self.cleanup_filter_window(event)
         
         # 设置中央部件和布局
         central_widget = QWidget()
         self.filter_window.setCentralWidget(central_widget)
         layout = QVBoxLayout(central_widget)
         
-        # 设置背景
-        ThemeManager.create_gradient_background(self.filter_window, self.current_theme)
+        # 输入停顿后才筛选，连续输入时不会每个按键都刷新列表
+        self.filter_timer = QTimer(self.filter_window)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(150)
+        self.filter_timer.timeout.connect(self.filter_by_diff)
         
         # 创建输入区域
-        min_label = self.ui.create_label(self.filter_window, "最小难度：", 16, ThemeManager.get_theme_color(self.current_theme))
+        min_label = self.ui.create_label(self.filter_window, "最小难度：", 16)
         layout.addWidget(min_label)
         
         # 创建水平布局容器来居中最小难度输入框
@@ -254,12 +295,12 @@ class App(QMainWindow):
         min_entry_layout.setContentsMargins(0, 0, 0, 0)
         min_entry_layout.addStretch(1)
         self.min_entry = self.ui.create_styled_entry(self.filter_window)
-        self.min_entry.textChanged.connect(self.filter_by_diff)  # 添加实时筛选
+        self.min_entry.textChanged.connect(self.filter_timer.start)  # 添加实时筛选
         min_entry_layout.addWidget(self.min_entry)
         min_entry_layout.addStretch(1)
         layout.addWidget(min_entry_container)
         
-        max_label = self.ui.create_label(self.filter_window, "最大难度：", 16, ThemeManager.get_theme_color(self.current_theme))
+        max_label = self.ui.create_label(self.filter_window, "最大难度：", 16)
         layout.addWidget(max_label)
         
         # 创建水平布局容器来居中最大难度输入框
@@ -268,80 +309,43 @@ class App(QMainWindow):
         max_entry_layout.setContentsMargins(0, 0, 0, 0)
         max_entry_layout.addStretch(1)
         self.max_entry = self.ui.create_styled_entry(self.filter_window)
-        self.max_entry.textChanged.connect(self.filter_by_diff)  # 添加实时筛选
+        self.max_entry.textChanged.connect(self.filter_timer.start)  # 添加实时筛选
         max_entry_layout.addWidget(self.max_entry)
         max_entry_layout.addStretch(1)
         layout.addWidget(max_entry_container)
         
-        # 创建结果列表并添加点击事件
-        self.result_list = QListWidget()
-        self.result_list.itemClicked.connect(self.on_question_selected)
-        self.result_list.setStyleSheet("""
-            QListWidget {
-                font-family: 'Microsoft YaHei';
-                font-size: 14px;
-                border: 1px solid #ddd;
-                border-radius: 4px;
-                background-color: white;
-                margin: 10px 0;
-            }
-            QListWidget::item {
-                padding: 8px;
-                border-bottom: 1px solid #eee;
-            }
-            QListWidget::item:selected {
-                background-color: #4a90e2;
-                color: white;
-            }
-            QListWidget::item:hover {
-                background-color: #f5f5f5;
-            }
-        """)
+        # 创建结果列表并添加点击事件；列表模型直接引用题库，滚动到底部时才加载下一页
+        self.question_model = QuestionListModel(self.hw, parent=self.filter_window)
+        self.result_list = QListView()
+        self.result_list.setUniformItemSizes(True)
+        self.result_list.setModel(self.question_model)
+        self.result_list.clicked.connect(self.on_question_selected)
+        self.result_list.setProperty('role', 'results')
         layout.addWidget(self.result_list)
         
         # 创建按钮
         button_frame = QFrame()
         button_layout = QHBoxLayout(button_frame)
         
-        back_btn = QPushButton("返回")
-        back_btn.setStyleSheet(f"""
-            QPushButton {{
-                background-color: {ThemeManager.THEMES[self.current_theme]['button']};
-                color: white;
-                border: none;
-                padding: 12px 24px;
-                border-radius: 8px;
-                font-family: 'Microsoft YaHei';
-                font-size: 14px;
-                min-width: 100px;
-            }}
-            QPushButton:hover {{
-                background-color: {ThemeManager.THEMES[self.current_theme]['button_hover']};
-            }}
-            QPushButton:pressed {{
-                background-color: {ThemeManager.THEMES[self.current_theme]['button_pressed']};
-            }}
-        """)
-        back_btn.clicked.connect(self.filter_window.close)
+        back_btn = self.ui.create_button("返回", self.filter_window.close)
         button_layout.addWidget(back_btn)
         
         layout.addWidget(button_frame)
-        
-        # 初始显示所有题目
+        return self.filter_window
+
+    def _reset_filter_page(self, window):
+        # 清空筛选条件，重新显示所有题目
+        self.min_entry.clear()
+        self.max_entry.clear()
+        self.filter_timer.stop()
         self.filter_by_diff()
+        self.result_list.clearSelection()
+        self.result_list.scrollToTop()
         
-        self.filter_window.show()
-        
-    def on_question_selected(self, item):
-        # 从列表项文本中提取题目ID
-        question_id = int(item.text().split('.')[0])
-        
-        # 在题库中找到对应的题目
-        selected_question = None
-        for question in self.hw.q_bank:
-            if question.id == question_id:
-                selected_question = question
-                break
+    def on_question_selected(self, index):
+        # 题目ID保存在模型的数据角色中
+        question_id = index.data(QUESTION_ID_ROLE)
+        selected_question = self.hw.get_question(question_id)
         
         if selected_question:
             # 更新当前题目
@@ -360,37 +364,35 @@ class App(QMainWindow):
             diff_min = int(self.min_entry.text()) if self.min_entry.text().strip() else None
             diff_max = int(self.max_entry.text()) if self.max_entry.text().strip() else None
 
-            # 验证输入范围
+            # 验证输入范围，无效的输入框显示红色边框
             if diff_min is not None and diff_min < 800:
-                self.min_entry.setStyleSheet("border-color: red;")
+                set_style_property(self.min_entry, 'invalid', True)
                 return
             else:
-                self.min_entry.setStyleSheet("")
+                set_style_property(self.min_entry, 'invalid', False)
 
             if diff_max is not None and diff_max > 2000:
-                self.max_entry.setStyleSheet("border-color: red;")
+                set_style_property(self.max_entry, 'invalid', True)
                 return
             else:
-                self.max_entry.setStyleSheet("")
+                set_style_property(self.max_entry, 'invalid', False)
 
             if diff_min is not None and diff_max is not None and diff_min > diff_max:
-                self.min_entry.setStyleSheet("border-color: red;")
-                self.max_entry.setStyleSheet("border-color: red;")
+                set_style_property(self.min_entry, 'invalid', True)
+                set_style_property(self.max_entry, 'invalid', True)
                 return
 
-            # 清空列表并添加新的筛选结果
-            self.result_list.clear()
-            filtered_questions = self.hw.search_by_diff(diff_min, diff_max)
-
-            for q in filtered_questions:
-                display_text = f"{q.id}. 难度: {q.diff} - {q.q.replace('*', '×').replace('/', '÷')}"
-                self.result_list.addItem(display_text)
+            # 模型只记录筛选结果在题库中的范围，显示文本在滚动到时才生成
+            self.question_model.set_range(diff_min, diff_max)
 
         except ValueError:
             # 输入非数字时不进行处理，保持当前显示
             pass
 
     def open_add_question_page(self):
+        self.windows.open('add_question')
+
+    def _build_add_question_page(self):
         # 创建新窗口
         self.add_window = QMainWindow(self)
         self.add_window.setWindowTitle("添加题目")
@@ -401,11 +403,8 @@ class App(QMainWindow):
         self.add_window.setCentralWidget(central_widget)
         layout = QVBoxLayout(central_widget)
         
-        # 设置背景
-        ThemeManager.create_gradient_background(self.add_window, self.current_theme)
-        
         # 创建输入区域
-        question_label = self.ui.create_label(self.add_window, "题目内容：", 16, ThemeManager.get_theme_color(self.current_theme))
+        question_label = self.ui.create_label(self.add_window, "题目内容：", 16)
         layout.addWidget(question_label)
         
         # 创建水平布局容器来居中题目输入框
@@ -418,7 +417,7 @@ class App(QMainWindow):
         question_layout.addStretch(1)
         layout.addWidget(question_container)
         
-        diff_label = self.ui.create_label(self.add_window, "难度 (800-2000)：", 16, ThemeManager.get_theme_color(self.current_theme))
+        diff_label = self.ui.create_label(self.add_window, "难度 (800-2000)：", 16)
         layout.addWidget(diff_label)
         
         # 创建水平布局容器来居中难度输入框
@@ -435,53 +434,19 @@ class App(QMainWindow):
         button_frame = QFrame()
         button_layout = QHBoxLayout(button_frame)
         
-        add_btn = QPushButton("添加")
-        add_btn.setStyleSheet(f"""
-            QPushButton {{
-                background-color: {ThemeManager.THEMES[self.current_theme]['button']};
-                color: white;
-                border: none;
-                padding: 12px 24px;
-                border-radius: 8px;
-                font-family: 'Microsoft YaHei';
-                font-size: 14px;
-                min-width: 100px;
-            }}
-            QPushButton:hover {{
-                background-color: {ThemeManager.THEMES[self.current_theme]['button_hover']};
-            }}
-            QPushButton:pressed {{
-                background-color: {ThemeManager.THEMES[self.current_theme]['button_pressed']};
-            }}
-        """)
-        add_btn.clicked.connect(lambda: self.add_question())
+        add_btn = self.ui.create_button("添加", lambda: self.add_question())
         button_layout.addWidget(add_btn)
         
-        back_btn = QPushButton("返回")
-        back_btn.setStyleSheet(f"""
-            QPushButton {{
-                background-color: {ThemeManager.THEMES[self.current_theme]['button']};
-                color: white;
-                border: none;
-                padding: 12px 24px;
-                border-radius: 8px;
-                font-family: 'Microsoft YaHei';
-                font-size: 14px;
-                min-width: 100px;
-            }}
-            QPushButton:hover {{
-                background-color: {ThemeManager.THEMES[self.current_theme]['button_hover']};
-            }}
-            QPushButton:pressed {{
-                background-color: {ThemeManager.THEMES[self.current_theme]['button_pressed']};
-            }}
-        """)
-        back_btn.clicked.connect(self.add_window.close)
+        back_btn = self.ui.create_button("返回", self.add_window.close)
         button_layout.addWidget(back_btn)
         
         layout.addWidget(button_frame)
-        
-        self.add_window.show()
+        return self.add_window
+
+    def _reset_add_question_page(self, window):
+        self.question_entry.clear()
+        self.diff_entry.clear()
+        self.question_entry.setFocus()
 
     def add_question(self):
         question_text = self.question_entry.text().replace('×', '*').replace('÷', '/')
@@ -505,6 +470,9 @@ class App(QMainWindow):
             QMessageBox.critical(self, "错误", str(e))
 
     def open_theme_page(self):
+        self.windows.open('theme')
+
+    def _build_theme_page(self):
         # 创建新窗口
         self.theme_window = QMainWindow(self)
         self.theme_window.setWindowTitle("主题设置")
@@ -515,91 +483,35 @@ class App(QMainWindow):
         self.theme_window.setCentralWidget(central_widget)
         layout = QVBoxLayout(central_widget)
         
-        # 设置背景
-        ThemeManager.create_gradient_background(self.theme_window, self.current_theme)
-        
         # 创建标题标签
         title_label = QLabel("选择主题")
-        title_label.setStyleSheet("""
-            QLabel {
-                color: white;
-                font-family: 'Microsoft YaHei';
-                font-size: 24px;
-                margin: 20px;
-            }
-        """)
+        title_label.setProperty('role', 'title')
         title_label.setAlignment(Qt.AlignCenter)
         layout.addWidget(title_label)
         
         # 创建主题按钮
-        theme = ThemeManager.THEMES[self.current_theme]
-        button_style = f"""
-            QPushButton {{
-                background-color: {theme['button']};
-                color: white;
-                padding: 15px;
-                border-radius: 8px;
-                font-family: 'Microsoft YaHei';
-                font-size: 16px;
-                margin: 10px;
-            }}
-            QPushButton:hover {{
-                background-color: {theme['button_hover']};
-            }}
-            QPushButton:pressed {{
-                background-color: {theme['button_pressed']};
-            }}
-        """
-        
         for theme_name in ThemeManager.THEMES.keys():
-            theme_btn = QPushButton(theme_name)
-            theme_btn.setStyleSheet(button_style)
-            theme_btn.clicked.connect(lambda checked, name=theme_name: self.change_theme(name))
+            theme_btn = self.ui.create_button(theme_name, lambda checked, name=theme_name: self.change_theme(name),
+                                              role='theme_option')
             layout.addWidget(theme_btn)
         
         # 返回按钮
-        back_btn = QPushButton("返回")
-        back_btn.setStyleSheet(button_style)
-        back_btn.clicked.connect(self.theme_window.close)
+        back_btn = self.ui.create_button("返回", self.theme_window.close, role='theme_option')
         layout.addWidget(back_btn)
-        
-        self.theme_window.show()
+        return self.theme_window
 
     def change_theme(self, theme_name):
         self.current_theme = theme_name
-        theme = ThemeManager.THEMES[theme_name]
-        
-        # 更新背景
-        ThemeManager.create_gradient_background(self, self.current_theme)
-        
-        # 更新按钮样式
-        button_style = f"""
-            QPushButton {{
-                background-color: {theme['button']};
-                color: white;
-                border: none;
-                padding: 12px 24px;
-                border-radius: 8px;
-                font-family: 'Microsoft YaHei';
-                font-size: 14px;
-                min-width: 100px;
-            }}
-            QPushButton:hover {{
-                background-color: {theme['button_hover']};
-            }}
-            QPushButton:pressed {{
-                background-color: {theme['button_pressed']};
-            }}
-        """
-        
-        # 更新所有按钮的样式
-        for child in self.findChildren(QPushButton):
-            child.setStyleSheet(button_style)
+        # 替换应用级样式表和调色板，所有窗口的背景和按钮一次更新
+        ThemeManager.apply(theme_name)
         
         self.theme_window.close()
         self.refresh_ui()
 
     def open_ai_chat_page(self):
+        self.windows.open('ai_chat')
+
+    def _build_ai_chat_page(self):
         # 创建新窗口
         self.chat_window = QMainWindow(self)
         self.chat_window.setWindowTitle("AI问答")
@@ -608,38 +520,15 @@ class App(QMainWindow):
         central_widget = QWidget()
         self.chat_window.setCentralWidget(central_widget)
         layout = QVBoxLayout(central_widget)
-        # 设置背景
-        ThemeManager.create_gradient_background(self.chat_window, self.current_theme)
         # --- 新增：分析过程和解答过程显示区 ---
-        from PyQt5.QtWidgets import QTextEdit
         self.reasoning_text = QTextEdit()
         self.reasoning_text.setReadOnly(True)
-        self.reasoning_text.setStyleSheet("""
-            QTextEdit {
-                font-family: 'Microsoft YaHei';
-                font-size: 22px;
-                color: #1565c0;
-                background-color: #e3f2fd;
-                border-radius: 8px;
-                padding: 16px;
-                margin-bottom: 10px;
-            }
-        """)
+        self.reasoning_text.setProperty('role', 'reasoning')
         self.reasoning_text.setPlaceholderText("AI分析过程将在此显示...")
         layout.addWidget(self.reasoning_text)
         self.answer_text = QTextEdit()
         self.answer_text.setReadOnly(True)
-        self.answer_text.setStyleSheet("""
-            QTextEdit {
-                font-family: 'Microsoft YaHei';
-                font-size: 24px;
-                color: #1b5e20;
-                background-color: #e8f5e9;
-                border-radius: 8px;
-                padding: 16px;
-                margin-bottom: 10px;
-            }
-        """)
+        self.answer_text.setProperty('role', 'answer')
         self.answer_text.setPlaceholderText("AI解答过程将在此显示...")
         layout.addWidget(self.answer_text)
         # 创建输入区域
@@ -647,75 +536,25 @@ class App(QMainWindow):
         input_layout = QHBoxLayout(input_frame)
         self.chat_entry = self.ui.create_styled_entry(self.chat_window, width=50, bind_submit=self.send_message)
         input_layout.addWidget(self.chat_entry)
-        send_btn = QPushButton("发送")
-        send_btn.setStyleSheet(f"""
-            QPushButton {{
-                background-color: {ThemeManager.THEMES[self.current_theme]['button']};
-                color: white;
-                border: none;
-                padding: 12px 24px;
-                border-radius: 8px;
-                font-family: 'Microsoft YaHei';
-                font-size: 14px;
-                min-width: 100px;
-            }}
-            QPushButton:hover {{
-                background-color: {ThemeManager.THEMES[self.current_theme]['button_hover']};
-            }}
-            QPushButton:pressed {{
-                background-color: {ThemeManager.THEMES[self.current_theme]['button_pressed']};
-            }}
-        """)
-        send_btn.clicked.connect(self.send_message)
+        send_btn = self.ui.create_button("发送", self.send_message)
         input_layout.addWidget(send_btn)
         layout.addWidget(input_frame)
         # 功能按钮
         button_frame = QFrame()
         button_layout = QHBoxLayout(button_frame)
-        clear_btn = QPushButton("清空对话")
-        clear_btn.setStyleSheet(f"""
-            QPushButton {{
-                background-color: {ThemeManager.THEMES[self.current_theme]['button']};
-                color: white;
-                border: none;
-                padding: 12px 24px;
-                border-radius: 8px;
-                font-family: 'Microsoft YaHei';
-                font-size: 14px;
-                min-width: 100px;
-            }}
-            QPushButton:hover {{
-                background-color: {ThemeManager.THEMES[self.current_theme]['button_hover']};
-            }}
-            QPushButton:pressed {{
-                background-color: {ThemeManager.THEMES[self.current_theme]['button_pressed']};
-            }}
-        """)
-        clear_btn.clicked.connect(self.clear_chat)
+        clear_btn = self.ui.create_button("清空对话", self.clear_chat)
         button_layout.addWidget(clear_btn)
-        back_btn = QPushButton("返回")
-        back_btn.setStyleSheet(f"""
-            QPushButton {{
-                background-color: {ThemeManager.THEMES[self.current_theme]['button']};
-                color: white;
-                border: none;
-                padding: 12px 24px;
-                border-radius: 8px;
-                font-family: 'Microsoft YaHei';
-                font-size: 14px;
-                min-width: 100px;
-            }}
-            QPushButton:hover {{
-                background-color: {ThemeManager.THEMES[self.current_theme]['button_hover']};
-            }}
-            QPushButton:pressed {{
-                background-color: {ThemeManager.THEMES[self.current_theme]['button_pressed']};
-            }}
-        """)
-        back_btn.clicked.connect(self.chat_window.close)
+        back_btn = self.ui.create_button("返回", self.chat_window.close)
         button_layout.addWidget(back_btn)
         layout.addWidget(button_frame)
-        self.chat_window.show()
+        return self.chat_window
+
+    def _reset_ai_chat_page(self, window):
+        # 对话历史保留，只清空显示区和输入框
+        self.chat_entry.clear()
+        self.reasoning_text.clear()
+        self.answer_text.clear()
+        self.chat_entry.setFocus()
 
     def send_message(self):
         user_input = self.chat_entry.text()
@@ -724,31 +563,66 @@ class App(QMainWindow):
         self.chat_entry.clear()
         self.reasoning_text.setText("AI正在思考分析...")
         self.answer_text.setText("")
-        QTimer.singleShot(1000, lambda: self.show_ai_response(user_input))
+        self.show_ai_response(user_input)
 
     def clear_chat(self):
+        self.tasks.cancel(tag='chat')
         self.reasoning_text.clear()
         self.answer_text.clear()
+        self.chat_history.clear()
 
     def show_ai_response(self, user_input):
-        try:
-            from API import chat_with_ai
-            ai_response, reasoning = chat_with_ai(user_input, timeout=30)
-            # 分段显示，保持可读性
-            def format_paragraphs(text):
-                # 先将####转为换行，再按段落分隔
-                text = text.replace('####', '\n')
-                return '\n\n'.join([p.strip() for p in text.split('\n') if p.strip()])
-            # 分别填充分析和解答内容
-            self.reasoning_text.setText(format_paragraphs(reasoning))
-            self.answer_text.setText(format_paragraphs(ai_response))
-        except Exception as e:
+        # 新的提问会取消还在进行的上一次对话；关闭对话窗口时同样取消
+        self._chat_started = set()
+        self.tasks.submit(
+            _chat_task, user_input, self.chat_history.messages(),
+            on_progress=self._on_chat_progress,
+            on_result=lambda result: self._on_chat_result(user_input, result),
+            on_error=self._on_chat_error,
+            owner=self.chat_window, tag='chat'
+        )
+
+    def _on_chat_progress(self, update):
+        widgets = {'reasoning': self.reasoning_text, 'content': self.answer_text}
+        for kind, text in update.items():
+            widget = widgets[kind]
+            # 收到第一个片段时清除占位提示
+            if kind not in self._chat_started:
+                self._chat_started.add(kind)
+                widget.clear()
+            widget.moveCursor(QTextCursor.End)
+            widget.insertPlainText(text)
+
+    def _on_chat_result(self, user_input, result):
+        if result is None:
+            return
+        if 'unavailable' in result:
             self.reasoning_text.setText("")
-            self.answer_text.setText(f"AI回复异常：{str(e)}。请稍后重试。")
+            self.answer_text.setText(f"AI功能不可用：{result['unavailable']}")
+            return
+        from latex_readable import convert_latex_to_readable
+        # 接收完成后统一转换公式并分段
+        self.reasoning_text.setText(_format_paragraphs(convert_latex_to_readable(result['reasoning'])))
+        self.answer_text.setText(_format_paragraphs(convert_latex_to_readable(result['content'])))
+        if result['content']:
+            self.chat_history.add_turn(user_input, result['content'])
+
+    def _on_chat_error(self, message):
+        self.reasoning_text.setText("")
+        self.answer_text.setText(f"AI回复异常：{message}。请稍后重试。")
+
+    def get_ai_question_pool(self):
+        # 首题显示后创建并启动应用题预生成池（在此之前就用到时立即创建）
+        if self.ai_question_pool is None:
+            with profiler.span('AI应用题预生成池'):
+                from ai_application_question import QuestionPrefetchPool
+                self.ai_question_pool = QuestionPrefetchPool(size=3).start()
+        return self.ai_question_pool
 
     def open_ai_application_question_page(self):
-        from ai_application_question import AIApplicationQuestion
-        from PyQt5.QtWidgets import QMainWindow, QVBoxLayout, QWidget, QLabel, QLineEdit, QPushButton, QMessageBox, QSizePolicy
+        self.windows.open('ai_application_question')
+
+    def _build_ai_application_question_page(self):
         self.ai_app_window = QMainWindow(self)
         self.ai_app_window.setWindowTitle("AI布置应用题")
         self.ai_app_window.resize(1024, 768)  # 设置初始大小
@@ -758,24 +632,13 @@ class App(QMainWindow):
         layout = QVBoxLayout(central_widget)
         layout.setContentsMargins(40, 40, 40, 40)  # 设置边距
         layout.setSpacing(20)  # 设置组件间距
-        ThemeManager.create_gradient_background(self.ai_app_window, self.current_theme)
-        self.ai_app = AIApplicationQuestion()
-        self.ai_question, self.ai_answer = self.ai_app.generate_question_and_answer()
         # 创建一个容器来包装题目标签
         question_container = QWidget()
         question_container.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         question_layout = QVBoxLayout(question_container)
-        self.ai_question_label = QLabel(f"题目：{self.ai_question}")
+        self.ai_question_label = QLabel("题目生成中...")
         self.ai_question_label.setWordWrap(True)  # 允许文字换行
-        self.ai_question_label.setStyleSheet("""
-            QLabel {
-                font-size: 24px;
-                color: #1565c0;
-                padding: 20px;
-                background-color: rgba(255, 255, 255, 0.9);
-                border-radius: 10px;
-            }
-        """)
+        self.ai_question_label.setProperty('role', 'ai_question')
         question_layout.addWidget(self.ai_question_label)
         layout.addWidget(question_container)
         # 创建答案输入区域
@@ -784,63 +647,18 @@ class App(QMainWindow):
         answer_layout = QVBoxLayout(answer_container)
         self.ai_answer_entry = QLineEdit()
         self.ai_answer_entry.setPlaceholderText("请输入你的答案")
-        self.ai_answer_entry.setStyleSheet("""
-            QLineEdit {
-                font-size: 22px;
-                padding: 15px;
-                margin: 10px;
-                border: 2px solid #4a90e2;
-                border-radius: 8px;
-                background-color: rgba(255, 255, 255, 0.9);
-            }
-            QLineEdit:focus {
-                border-color: #2196f3;
-                background-color: white;
-            }
-        """)
+        self.ai_answer_entry.setProperty('role', 'ai_answer')
         answer_layout.addWidget(self.ai_answer_entry)
         layout.addWidget(answer_container)
         # 创建按钮容器
         button_container = QWidget()
         button_container.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
         button_layout = QHBoxLayout(button_container)
-        submit_btn = QPushButton("提交答案")
-        submit_btn.setStyleSheet("""
-            QPushButton {
-                font-size: 20px;
-                background-color: #4a90e2;
-                color: white;
-                padding: 15px 30px;
-                border-radius: 10px;
-                min-width: 150px;
-            }
-            QPushButton:hover {
-                background-color: #357abd;
-            }
-            QPushButton:pressed {
-                background-color: #2a5f9e;
-            }
-        """)
-        submit_btn.clicked.connect(self.check_ai_application_answer)
+        submit_btn = self.ui.create_button("提交答案", self.check_ai_application_answer, role='large')
         button_layout.addWidget(submit_btn)
-        back_btn = QPushButton("返回")
-        back_btn.setStyleSheet("""
-            QPushButton {
-                font-size: 20px;
-                background-color: #888;
-                color: white;
-                padding: 15px 30px;
-                border-radius: 10px;
-                min-width: 150px;
-            }
-            QPushButton:hover {
-                background-color: #666;
-            }
-            QPushButton:pressed {
-                background-color: #444;
-            }
-        """)
-        back_btn.clicked.connect(self.ai_app_window.close)
+        next_btn = self.ui.create_button("换一题", self.next_ai_application_question, role='large')
+        button_layout.addWidget(next_btn)
+        back_btn = self.ui.create_button("返回", self.ai_app_window.close, role='secondary')
         button_layout.addWidget(back_btn)
         layout.addWidget(button_container)
         # 创建结果标签容器
@@ -849,22 +667,51 @@ class App(QMainWindow):
         result_layout = QVBoxLayout(result_container)
         self.ai_result_label = QLabel("")
         self.ai_result_label.setWordWrap(True)  # 允许文字换行
-        self.ai_result_label.setStyleSheet("""
-            QLabel {
-                font-size: 22px;
-                color: #1b5e20;
-                padding: 20px;
-                background-color: rgba(255, 255, 255, 0.9);
-                border-radius: 10px;
-            }
-        """)
+        self.ai_result_label.setProperty('role', 'ai_result')
         result_layout.addWidget(self.ai_result_label)
         layout.addWidget(result_container)
-        self.ai_app_window.show()
+        return self.ai_app_window
+
+    def _reset_ai_application_question_page(self, window):
+        # 窗口先显示，题目在后台从预生成池中取出后再填入
+        self.next_ai_application_question()
 
     def check_ai_application_answer(self):
         user_ans = self.ai_answer_entry.text().strip()
         if not user_ans:
             QMessageBox.warning(self, "提示", "请输入答案！")
             return
-        self.ai_result_label.setText(f"标准答案：{self.ai_answer}")
+        if self.ai_question is None:
+            QMessageBox.warning(self, "提示", "题目还在生成中，请稍候！")
+            return
+        # 题目入池前已用Un校验过算式，这里直接按数值比较学生答案
+        answer = self.ai_answer
+        self.tasks.submit(
+            _check_answer_task, user_ans, answer,
+            on_result=lambda correct: self._show_ai_check_result(user_ans, answer, correct),
+            owner=self.ai_app_window, tag='ai_check'
+        )
+
+    def _show_ai_check_result(self, user_ans, answer, correct):
+        if correct is None:
+            self.ai_result_label.setText(f"标准答案：{answer}")
+        elif correct:
+            self.ai_result_label.setText(f"正确！标准答案：{answer}")
+        else:
+            self.ai_result_label.setText(f"错误，你的答案是 {user_ans}，标准答案：{answer}")
+
+    def next_ai_application_question(self):
+        # 在后台从预生成池中取下一道题，取到之前不能提交答案
+        self.ai_question, self.ai_answer = None, None
+        self.ai_question_label.setText("题目生成中...")
+        self.ai_answer_entry.clear()
+        self.ai_result_label.setText("")
+        self.tasks.submit(
+            _fetch_question_task, self.get_ai_question_pool(),
+            on_result=self._show_ai_application_question,
+            owner=self.ai_app_window, tag='ai_question'
+        )
+
+    def _show_ai_application_question(self, pair):
+        self.ai_question, self.ai_answer = pair
+        self.ai_question_label.setText(f"题目：{self.ai_question}")
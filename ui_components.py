@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
-from PyQt5.QtWidgets import QLineEdit, QLabel, QWidget, QVBoxLayout
-from PyQt5.QtGui import QPalette, QColor, QLinearGradient, QPainter
-from PyQt5.QtCore import Qt, pyqtSignal
+from functools import lru_cache
+
+from PyQt5.QtWidgets import QApplication, QLineEdit, QLabel, QPushButton
+from PyQt5.QtGui import QPalette, QColor, QLinearGradient, QGradient
+from PyQt5.QtCore import Qt
 
 # 通用样式常量
 COMMON_STYLES = {
@@ -12,58 +14,217 @@ COMMON_STYLES = {
     'border_color': 'rgba(255, 255, 255, 0.2)'
 }
 
+# create_label 支持的字号，每个字号在样式表中对应一条规则
+LABEL_FONT_SIZES = (16, 18, 24)
+
+# 样式表中用到主题颜色的控件 role，切换主题后只需重新应用这些控件的样式
+THEMED_ROLES = frozenset({'toolbar', 'primary', 'theme_option', 'large', 'results', 'ai_answer'})
+
+
+def set_style_property(widget, name, value):
+    """设置控件的动态属性并重新应用样式表（属性选择器不会自动刷新）"""
+    if widget.property(name) == value:
+        return
+    widget.setProperty(name, value)
+    style = widget.style()
+    style.unpolish(widget)
+    style.polish(widget)
+
+
 class UIComponents:
-    """UI组件管理类"""
+    """UI组件管理类
+
+    控件只设置 role 等动态属性，外观由 ThemeManager 生成的应用级样式表决定。
+    """
     @staticmethod
     def create_styled_entry(parent, width=20, bind_submit=None):
         entry = QLineEdit(parent)
+        entry.setProperty('role', 'entry')
         entry.setFixedWidth(width * 12)
-        entry.setStyleSheet(f"""
-            QLineEdit {{
-                padding: 10px 15px;
-                border: 2px solid rgba(221, 221, 221, 0.8);
-                border-radius: 8px;
-                font-family: {COMMON_STYLES['font_family']};
-                font-size: 15px;
-                background-color: rgba(255, 255, 255, 0.85);
-                backdrop-filter: {COMMON_STYLES['backdrop_filter']};
-            }}
-            QLineEdit:focus {{
-                border-color: rgba(74, 144, 226, 0.8);
-                background-color: rgba(255, 255, 255, 0.95);
-                outline: none;
-            }}
-        """)
         entry.setAttribute(Qt.WA_TranslucentBackground)
         entry.setAlignment(Qt.AlignCenter)
-        
+
         if bind_submit:
             entry.returnPressed.connect(bind_submit)
         return entry
-    
+
     @staticmethod
-    def create_label(parent, text, font_size, bg_color, **kwargs):
+    def create_label(parent, text, font_size, **kwargs):
         label = QLabel(text, parent)
-        label.setStyleSheet(f"""
-            QLabel {{
-                font-family: {COMMON_STYLES['font_family']};
-                font-size: {font_size}px;
-                background-color: rgba(255, 255, 255, {COMMON_STYLES['background_opacity']});
-                padding: 15px 20px;
-                border-radius: {COMMON_STYLES['border_radius']};
-                color: #333;
-                font-weight: 500;
-                backdrop-filter: {COMMON_STYLES['backdrop_filter']};
-                border: 1px solid {COMMON_STYLES['border_color']};
-            }}
-        """)
-        
+        label.setProperty('role', 'card')
+        label.setProperty('fontSize', str(font_size))
+
         label.setAlignment(Qt.AlignCenter if 'anchor' not in kwargs or kwargs['anchor'] != 'nw'
                           else Qt.AlignLeft | Qt.AlignTop)
         return label
 
+    @staticmethod
+    def create_button(text, command=None, role='primary'):
+        """创建按钮；role 对应样式表中的按钮类型（primary/large/secondary/theme_option）"""
+        btn = QPushButton(text)
+        btn.setProperty('role', role)
+        if command:
+            btn.clicked.connect(command)
+        return btn
+
+
+# 应用级样式表模板，所有主题共用；主题颜色通过调色板引用（见 ThemeManager.palette）：
+# alternate-base 为主题起始色，highlight 为按钮颜色，link 和 link-visited 为按钮悬停和按下时的颜色
+_STYLESHEET = """
+QFrame[role="content"] {{
+    background-color: rgba(255, 255, 255, 0.75);
+    border-radius: 15px;
+    padding: 20px;
+    border: 1px solid rgba(255, 255, 255, 0.3);
+}}
+QFrame[role="toolbar"] {{
+    background-color: palette(alternate-base);
+    border-radius: 10px;
+    padding: 15px;
+    border: 1px solid rgba(255, 255, 255, 0.2);
+}}
+QPushButton[role="primary"] {{
+    background-color: palette(highlight);
+    color: white;
+    border: none;
+    padding: 12px 24px;
+    border-radius: 8px;
+    font-family: '{font}';
+    font-size: 14px;
+    min-width: 100px;
+}}
+QPushButton[role="theme_option"] {{
+    background-color: palette(highlight);
+    color: white;
+    padding: 15px;
+    border-radius: 8px;
+    font-family: '{font}';
+    font-size: 16px;
+    margin: 10px;
+}}
+QPushButton[role="large"], QPushButton[role="secondary"] {{
+    font-size: 20px;
+    background-color: palette(highlight);
+    color: white;
+    padding: 15px 30px;
+    border-radius: 10px;
+    min-width: 150px;
+}}
+QPushButton[role="primary"]:hover, QPushButton[role="theme_option"]:hover, QPushButton[role="large"]:hover {{
+    background-color: palette(link);
+}}
+QPushButton[role="primary"]:pressed, QPushButton[role="theme_option"]:pressed, QPushButton[role="large"]:pressed {{
+    background-color: palette(link-visited);
+}}
+QPushButton[role="secondary"] {{
+    background-color: #888;
+}}
+QPushButton[role="secondary"]:hover {{
+    background-color: #666;
+}}
+QPushButton[role="secondary"]:pressed {{
+    background-color: #444;
+}}
+QLineEdit[role="entry"] {{
+    padding: 10px 15px;
+    border: 2px solid rgba(221, 221, 221, 0.8);
+    border-radius: 8px;
+    font-family: {font};
+    font-size: 15px;
+    background-color: rgba(255, 255, 255, 0.85);
+}}
+QLineEdit[role="entry"]:focus {{
+    border-color: rgba(74, 144, 226, 0.8);
+    background-color: rgba(255, 255, 255, 0.95);
+}}
+QLineEdit[role="entry"][invalid="true"] {{
+    border-color: red;
+}}
+QLabel[role="card"] {{
+    font-family: {font};
+    background-color: rgba(255, 255, 255, {opacity});
+    padding: 15px 20px;
+    border-radius: {radius};
+    color: #333;
+    font-weight: 500;
+    border: 1px solid {border};
+}}
+{label_sizes}
+QLabel[role="title"] {{
+    color: white;
+    font-family: '{font}';
+    font-size: 24px;
+    margin: 20px;
+}}
+QListView[role="results"] {{
+    font-family: '{font}';
+    font-size: 14px;
+    border: 1px solid #ddd;
+    border-radius: 4px;
+    background-color: white;
+    margin: 10px 0;
+}}
+QListView[role="results"]::item {{
+    padding: 8px;
+    border-bottom: 1px solid #eee;
+}}
+QListView[role="results"]::item:selected {{
+    background-color: palette(highlight);
+    color: white;
+}}
+QListView[role="results"]::item:hover {{
+    background-color: #f5f5f5;
+}}
+QTextEdit[role="reasoning"], QTextEdit[role="answer"] {{
+    font-family: '{font}';
+    border-radius: 8px;
+    padding: 16px;
+    margin-bottom: 10px;
+}}
+QTextEdit[role="reasoning"] {{
+    font-size: 22px;
+    color: #1565c0;
+    background-color: #e3f2fd;
+}}
+QTextEdit[role="answer"] {{
+    font-size: 24px;
+    color: #1b5e20;
+    background-color: #e8f5e9;
+}}
+QLabel[role="ai_question"], QLabel[role="ai_result"] {{
+    padding: 20px;
+    background-color: rgba(255, 255, 255, 0.9);
+    border-radius: 10px;
+}}
+QLabel[role="ai_question"] {{
+    font-size: 24px;
+    color: #1565c0;
+}}
+QLabel[role="ai_result"] {{
+    font-size: 22px;
+    color: #1b5e20;
+}}
+QLineEdit[role="ai_answer"] {{
+    font-size: 22px;
+    padding: 15px;
+    margin: 10px;
+    border: 2px solid palette(highlight);
+    border-radius: 8px;
+    background-color: rgba(255, 255, 255, 0.9);
+}}
+QLineEdit[role="ai_answer"]:focus {{
+    border-color: palette(link);
+    background-color: white;
+}}
+"""
+
+
 class ThemeManager:
-    """主题管理类"""
+    """主题管理类
+
+    所有主题共用一份应用级样式表，每个主题编译一个调色板（背景渐变和主题颜色）并缓存，
+    切换主题只需 apply() 一次，所有窗口中的控件按 role 属性匹配样式，不再逐个设置样式表。
+    """
     THEMES = {
         '蓝色主题': {
             'start': {'r': 230, 'g': 243, 'b': 255},  # E6F3FF
@@ -101,26 +262,62 @@ class ThemeManager:
             'button_pressed': '#E64A19'
         }
     }
-    
+
     @staticmethod
-    def get_theme_color(theme_name):
-        theme = ThemeManager.THEMES[theme_name]
-        return "#{:02x}{:02x}{:02x}".format(
-            theme['start']['r'],
-            theme['start']['g'],
-            theme['start']['b']
+    @lru_cache(maxsize=None)
+    def stylesheet():
+        """应用级样式表（所有主题共用，编译一次后缓存）"""
+        label_sizes = '\n'.join(
+            f'QLabel[role="card"][fontSize="{size}"] {{ font-size: {size}px; }}'
+            for size in LABEL_FONT_SIZES
+        )
+        return _STYLESHEET.format(
+            font=COMMON_STYLES['font_family'],
+            radius=COMMON_STYLES['border_radius'],
+            opacity=COMMON_STYLES['background_opacity'],
+            border=COMMON_STYLES['border_color'],
+            label_sizes=label_sizes,
         )
-    
+
     @staticmethod
-    def create_gradient_background(parent, theme_name):
+    @lru_cache(maxsize=None)
+    def palette(theme_name):
+        """主题的调色板：窗口背景为从上到下的渐变，并带有样式表引用的主题颜色（编译一次后缓存）
+
+        渐变使用相对于控件大小的坐标，窗口缩放后仍然铺满整个窗口，不需要重新生成。
+        """
         theme = ThemeManager.THEMES[theme_name]
         start, end = theme['start'], theme['end']
-        
-        gradient = QLinearGradient(0, 0, 0, parent.height())
-        gradient.setColorAt(0.0, QColor(start['r'], start['g'], start['b']))
+        start_color = QColor(start['r'], start['g'], start['b'])
+
+        gradient = QLinearGradient(0, 0, 0, 1)
+        gradient.setCoordinateMode(QGradient.ObjectBoundingMode)
+        gradient.setColorAt(0.0, start_color)
         gradient.setColorAt(1.0, QColor(end['r'], end['g'], end['b']))
-        
-        palette = parent.palette()
+
+        palette = QPalette(QApplication.palette())
         palette.setBrush(QPalette.Window, gradient)
-        parent.setPalette(palette)
-        parent.setAutoFillBackground(True)
\ No newline at end of file
+        palette.setColor(QPalette.AlternateBase, start_color)
+        palette.setColor(QPalette.Highlight, QColor(theme['button']))
+        palette.setColor(QPalette.Link, QColor(theme['button_hover']))
+        palette.setColor(QPalette.LinkVisited, QColor(theme['button_pressed']))
+        return palette
+
+    @staticmethod
+    def apply(theme_name):
+        """把主题应用到整个程序（所有已打开和之后创建的窗口）
+
+        样式表只在第一次设置，之后切换主题只替换调色板。样式表中的 palette() 在控件应用样式时取值，
+        所以还要重新应用 THEMED_ROLES 中控件的样式，其余控件不受影响。
+        """
+        app = QApplication.instance()
+        app.setPalette(ThemeManager.palette(theme_name))
+        stylesheet = ThemeManager.stylesheet()
+        if app.styleSheet() != stylesheet:
+            app.setStyleSheet(stylesheet)
+            return
+        style = app.style()
+        for widget in app.allWidgets():
+            if widget.property('role') in THEMED_ROLES:
+                style.unpolish(widget)
+                style.polish(widget)
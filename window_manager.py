@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+window_manager.py
+二级窗口（难度筛选、增加题目、主题设置、AI问答、AI布置应用题）的缓存：每个窗口在第一次打开时才创建，
+之后关闭只是隐藏，再次打开时复用同一个窗口并重置其内容；窗口只在 release() 时统一释放
+"""
+from PyQt5.QtCore import QObject
+
+from startup_profile import profiler
+
+
+class WindowManager(QObject):
+    """按名称管理可复用的二级窗口
+
+    用法：
+        windows.register('filter', build=self._build_filter_page, reset=self._reset_filter_page)
+        windows.open('filter')
+
+    build() 创建并返回窗口（不显示）；reset(window) 在每次显示前调用，把窗口恢复到刚打开时的状态。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pages = {}
+        self._windows = {}
+
+    def register(self, name, build, reset=None):
+        """登记窗口的创建函数和显示前的重置函数"""
+        self._pages[name] = (build, reset)
+
+    def get(self, name):
+        """已创建的窗口，尚未创建时返回None"""
+        return self._windows.get(name)
+
+    def open(self, name):
+        """显示窗口：首次打开时创建，之后复用；返回窗口"""
+        build, reset = self._pages[name]
+        window = self._windows.get(name)
+        if window is None:
+            with profiler.span(f'窗口 {name}'):
+                window = build()
+            self._windows[name] = window
+            # 窗口被其他途径销毁时不再复用
+            window.destroyed.connect(lambda _=None, name=name, window=window: self._forget(name, window))
+        if reset is not None:
+            reset(window)
+        window.show()
+        window.raise_()
+        window.activateWindow()
+        return window
+
+    def _forget(self, name, window):
+        if self._windows.get(name) is window:
+            del self._windows[name]
+
+    def release(self, name):
+        """关闭并释放窗口，下次打开时重新创建"""
+        window = self._windows.pop(name, None)
+        if window is not None:
+            window.close()
+            window.deleteLater()
+
+    def release_all(self):
+        for name in list(self._windows):
+            self.release(name)